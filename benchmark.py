@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+
+# NinjaOneToolKit - Benchmarks
+# Times the main options end to end against the mock NinjaOne API (mock_ninja.py) with synthetic AD and XLSX data,
+# so changes can be compared run to run. Every size runs in its own process so memory and state never carry over
+# - Synthetic data (a Get-ADComputer style CSV and a tracking XLSX sheet) is generated once per size and reused
+# - Each step reports wall time, peak RSS while it ran and how many API requests it made (and how many were throttled)
+# - Results are written as JSON to Benchmarks\results-<date>.json
+#
+# Usage : python3 benchmark.py [--sizes 1000,10000,100000] [--throttle-every 10] [--output PATH]
+
+import os
+import sys
+import csv
+import json
+import time
+import shutil
+import warnings
+import argparse
+import platform
+import threading
+import contextlib
+import subprocess
+from datetime import datetime
+from urllib.request import urlopen
+
+import metrics
+import mock_ninja
+
+
+default_sizes = [1000, 10000, 100000]
+steps = ["get_token", "get_devices_detailed", "get_ad_computers", "device_in_domain_not_ninja", "get_excel_data", "compare_res", "generate_xlsx"]
+
+# Tracking sheet layout handed to main through the XL_* settings
+sheet_name = "Computers"
+sheet_header = ["ID", "System Name", "In Ninja?", "In Domain?"]
+
+
+# Synthetic data
+# The domain holds 90% of the NinjaOne devices plus 5% that are only in the domain and 5% RRC servers that are ignored.
+# The sheet lists 95% of the NinjaOne devices, the domain only devices and 5% retired devices that are in neither
+def generate_ad_csv(path, size):
+    in_ninja = size * 90 // 100
+    with open(path, "w", newline="") as f:
+        f.write("#TYPE Microsoft.ActiveDirectory.Management.ADComputer\n")
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+        writer.writerow(["DistinguishedName", "DNSHostName", "Enabled", "IPv4Address", "Name", "ObjectClass"])
+        for i in range(1, size + 1):
+            if i <= in_ninja:
+                name = mock_ninja.device_name(i)
+            elif i <= in_ninja + size * 5 // 100:
+                name = "LAB-" + str(i).zfill(6)
+            else:
+                name = "RRC-SRV" + str(i).zfill(6)
+            ip = "" if i % 17 == 0 else mock_ninja.device_ip(i) if i <= in_ninja else "172.16.%d.%d" % (i // 256 % 256, i % 256)
+            writer.writerow(["CN=" + name + ",OU=Computers,DC=mock,DC=local", name.lower() + ".mock.local", "True", ip, name, "computer"])
+
+
+def generate_xlsx(path, size):
+    import xlsx_io
+
+    in_ninja = size * 95 // 100
+
+    def rows():
+        for i in range(1, size + 1):
+            if i <= in_ninja:
+                name = mock_ninja.device_name(i)
+            elif i <= in_ninja + size * 5 // 200:
+                name = "LAB-" + str(size * 90 // 100 + i - in_ninja).zfill(6)
+            else:
+                name = "OLD-" + str(i).zfill(6)
+            yield [i, name, "Y" if i % 3 else "N", "Y" if i % 4 else "N"] # Some statuses start out wrong so there is something to write back
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore') # openpyxl warns about table columns in write-only mode even though they are filled in
+        xlsx_io.write_streaming_xlsx(path, sheet_header, rows(), "Computers", sheet_title=sheet_name)
+
+
+# Generate the data for a size unless it is already there from an earlier run
+def generate_data(folder, size):
+    csv_path = os.path.join(folder, "computers-" + str(size) + ".csv")
+    xlsx_path = os.path.join(folder, "tracking-" + str(size) + ".xlsx")
+
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    if not os.path.exists(csv_path):
+        print("Generating " + csv_path + "...")
+        generate_ad_csv(csv_path, size)
+    if not os.path.exists(xlsx_path):
+        print("Generating " + xlsx_path + "...")
+        generate_xlsx(xlsx_path, size)
+    return csv_path, xlsx_path
+
+
+# Samples RSS on a background thread while a step runs and keeps the highest value seen
+class PeakMemory:
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = None
+        self.done = threading.Event()
+
+    def sample(self):
+        value = metrics.rss_mb()
+        if value is not None and (self.peak is None or value > self.peak):
+            self.peak = value
+
+    def run(self):
+        while not self.done.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self.sample()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.done.set()
+        self.thread.join()
+        self.sample()
+
+
+# Benchmark run for a single size, this runs in its own process
+def mock_stats(base_url, reset=True):
+    with urlopen(base_url + "/_stats" + ("?reset=1" if reset else "")) as response:
+        return json.loads(response.read())
+
+
+def run_size(size, base_url, csv_path, xlsx_path, work):
+    # Everything main writes (logs, XLSX results, token cache) goes into the work folder
+    os.environ.update({
+        "NINJA_URL": base_url, "CLIENT_ID": "benchmark", "CLIENT_SECRET": "benchmark", "DOMAIN_ORG_ID": "1",
+        "SNAPSHOT_TTL": "0", "TOKEN_CACHE_PATH": os.path.join(work, "token_cache.json"),
+        "AD_SOURCE": "file", "AD_FILE_PATH": csv_path,
+        "XL_PATH": xlsx_path, "XL_WORKSHEET_NAME": sheet_name, "XL_MIN_ROW": "2", "XL_MAX_ROW": str(size + 1),
+        "XL_ID_COL": "0", "XL_SYS_NAME_COL": "1", "XL_NINJA_STATUS_COL": "2", "XL_DOMAIN_STATUS_COL": "3",
+        "XL_NINJA_STATUS_COL_LETTER": "C", "XL_DOMAIN_STATUS_COL_LETTER": "D", "XL_WRITEBACK": "workbook",
+    })
+    os.chdir(work)
+
+    import main
+    main.env_path = os.devnull # Leave the .env of the install out so every run is measured with the same settings
+    main.user_sel = 1
+    main.orgs = ["Mock Organization 1"]
+    main.orgs_id = [1]
+
+    calls = {
+        "get_token": main.get_token,
+        "get_devices_detailed": lambda: main.get_devices_detailed(main.api_token),
+        "get_ad_computers": main.get_ad_computers,
+        "device_in_domain_not_ninja": main.device_in_domain_not_ninja,
+        "get_excel_data": main.get_excel_data,
+        "compare_res": main.compare_res,
+        "generate_xlsx": main.generate_xlsx,
+    }
+
+    results = []
+    mock_stats(base_url)
+    for step in steps:
+        # The options print their tables, which is part of what is being timed, but nobody needs to see them
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), PeakMemory() as memory:
+            start = time.perf_counter()
+            calls[step]()
+            elapsed = time.perf_counter() - start
+        stats = mock_stats(base_url)
+        results.append({
+            "size": size,
+            "step": step,
+            "wall_s": round(elapsed, 4),
+            "peak_rss_mb": None if memory.peak is None else round(memory.peak, 1),
+            "requests": stats["requests"],
+            "throttled": stats["throttled"],
+        })
+    return results
+
+
+# Run one size in a fresh process, with its own mock API, and return its results
+def benchmark_size(size, args):
+    csv_path, xlsx_path = generate_data(os.path.join(args.folder, "data"), size)
+
+    work = os.path.join(args.folder, "work-" + str(size))
+    if os.path.exists(work):
+        shutil.rmtree(work)
+    os.makedirs(work)
+    # compare_res writes statuses back, so every run starts from a fresh copy of the sheet
+    sheet = os.path.join(work, os.path.basename(xlsx_path))
+    shutil.copy(xlsx_path, sheet)
+
+    mock = subprocess.Popen([sys.executable, os.path.abspath(mock_ninja.__file__), "--devices", str(size),
+                             "--throttle-every", str(args.throttle_every)], stdout=subprocess.PIPE, text=True)
+    try:
+        base_url = mock.stdout.readline().strip()
+        p = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", str(size), "--base-url", base_url,
+                            "--csv", csv_path, "--xlsx", sheet, "--work", work], cwd=os.path.dirname(os.path.abspath(__file__)),
+                           capture_output=True, text=True)
+    finally:
+        mock.terminate()
+        mock.wait()
+
+    if p.returncode != 0:
+        raise RuntimeError("Benchmark for " + str(size) + " devices failed - " + p.stderr.strip())
+    return json.loads(p.stdout.strip().splitlines()[-1])
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark NinjaOneToolKit against a mock NinjaOne API")
+    parser.add_argument('--sizes', default=",".join(str(size) for size in default_sizes), help="Comma separated device counts (default: 1000,10000,100000)")
+    parser.add_argument('--throttle-every', type=int, default=10, help="The mock API answers every Nth request with 429 (default: 10, 0 to never throttle)")
+    parser.add_argument('--folder', default=os.path.join(os.getcwd(), "Benchmarks"), help="Where data, work files and results go (default: Benchmarks in the CWD)")
+    parser.add_argument('-o', '--output', help="Path of the results JSON (default: Benchmarks/results-<date>.json)")
+    # Used internally to run a single size in its own process
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--base-url', help=argparse.SUPPRESS)
+    parser.add_argument('--csv', help=argparse.SUPPRESS)
+    parser.add_argument('--xlsx', help=argparse.SUPPRESS)
+    parser.add_argument('--work', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print(json.dumps(run_size(args.child, args.base_url, args.csv, args.xlsx, args.work)))
+        return 0
+
+    args.folder = os.path.abspath(args.folder)
+    report = {
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "throttle_every": args.throttle_every,
+        "results": [],
+    }
+
+    for size in [int(size) for size in args.sizes.split(",") if size.strip() != ""]:
+        print("Benchmarking " + str(size) + " devices...")
+        try:
+            results = benchmark_size(size, args)
+        except Exception as Error:
+            print("ERROR: ", Error)
+            return 1
+        report["results"].extend(results)
+        for r in results:
+            print("  %-28s %9.3f s %9s MB %6d requests (%d throttled)" % (r["step"], r["wall_s"],
+                  "?" if r["peak_rss_mb"] is None else "%.1f" % r["peak_rss_mb"], r["requests"], r["throttled"]))
+
+    output_path = args.output or os.path.join(args.folder, "results-" + datetime.now().strftime("%Y-%m-%d-%H-%M-%S") + ".json")
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print("\nResults have been saved in " + output_path + "...")
+    return 0
+
+
+if __name__=="__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+# NinjaOneToolKit - Change detection
+# Reports only what changed since the last inventory run instead of the whole fleet again
+# - Every device in NinjaOne and computer in the domain is kept as a short hash of the values we care about,
+#   plus the few values a change report needs to say what it changed from (name, status, OS, memory)
+# - A run compares the current fingerprints with the previous ones in one pass over each side (added, removed, changed),
+#   so the report stays small and fast to produce no matter how big the fleet is
+# - Fingerprints are saved to a JSON state file per set of organizations, swapped into place so a crash never leaves half a file
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+
+import reconcile
+
+
+# Values that make up a device's fingerprint, last login and last boot change all the time so they are left out
+# The organization isn't part of it, the state file is already kept per set of organizations and not every option fills it in
+device_fields = ["name", "status", "os", "brand", "model", "serial", "memory", "processor"]
+# Values kept alongside the hash so a change can be described, in the order they are stored after it
+watched_fields = [("name", "Name"), ("status", "Status"), ("os", "OS"), ("memory", "Memory (GB)")]
+
+
+# A short hash of a list of values
+def fingerprint(values):
+    return hashlib.blake2b("\x1f".join(str(value) for value in values).encode("utf-8"), digest_size=8).hexdigest()
+
+
+# Fingerprint of a NinjaOne device, keyed by its id : [hash, name, status, os, memory]
+def device_entry(device):
+    return [fingerprint([getattr(device, field) for field in device_fields])] + [getattr(device, field) for field, label in watched_fields]
+
+
+# Fingerprint of a computer in the domain, keyed by its normalized name : [hash, name, in ninja]
+def ad_entry(name, dns, ip, in_ninja):
+    return [fingerprint([name, dns, ip]), name, in_ninja]
+
+
+class InventoryState:
+    def __init__(self, path, scope=""):
+        self.path = path
+        self.scope = scope # Organizations the fingerprints were taken from, ie. "1,7"
+        self.taken = None
+        self.fields = device_fields # Values the device fingerprints were taken from
+        self.ninja = {} # str(device id): device_entry()
+        self.ad = {} # name key: ad_entry()
+
+    # Load the fingerprints of the last run from the state file, returns None if there wasn't one
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+
+        state = cls(path, data.get("scope", ""))
+        state.taken = data.get("taken")
+        state.fields = data.get("fields", device_fields + ["org"]) # Files saved before the fields were recorded included the org
+        state.ninja = data.get("ninja", {})
+        state.ad = data.get("ad", {})
+        return state
+
+    # Fingerprint the current devices in NinjaOne (a DeviceTable) and the domain (rows of name, dns, ip)
+    # in_ninja(name) says whether a domain computer has an agent
+    @classmethod
+    def capture(cls, path, scope, devices, ad_rows, in_ninja):
+        state = cls(path, scope)
+        state.taken = time.time()
+        for device in devices:
+            state.ninja[str(device.id)] = device_entry(device)
+        for name, dns, ip in ad_rows:
+            key = reconcile.name_key(name)
+            if key is not None:
+                state.ad[key] = ad_entry(name, dns, ip, in_ninja(name))
+        return state
+
+    # Write the state through a temp file and swap it into place
+    def save(self):
+        folder = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".inventory-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"scope": self.scope, "taken": self.taken, "fields": self.fields, "ninja": self.ninja, "ad": self.ad}, f, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+# Describe what changed between two device entries, ie. "Status: Online -> Offline"
+def describe_change(old, new):
+    details = []
+    for i, (field, label) in enumerate(watched_fields):
+        if str(old[i + 1]) != str(new[i + 1]):
+            details.append(label + ": " + str(old[i + 1]) + " -> " + str(new[i + 1]))
+    return "; ".join(details) or "Hardware details changed"
+
+
+# Rows of [change, source, system name, details] for everything that changed between two states, NinjaOne first then the domain
+# Entries with the same hash are skipped without looking any further, so this is a single dict lookup per device
+# When the fingerprints were taken from other values (an older state file) only the watched values can be compared
+def diff(previous, current):
+    rows = []
+    same_fields = previous.fields == current.fields
+
+    for key, new in current.ninja.items():
+        old = previous.ninja.get(key)
+        if old is None:
+            rows.append(["added", "NinjaOne", new[1], "Status: " + str(new[2]) + ", OS: " + str(new[3])])
+        elif old[0] != new[0] and (same_fields or [str(v) for v in old[1:]] != [str(v) for v in new[1:]]):
+            change = "offline" if old[2] == "Online" and new[2] == "Offline" else "changed"
+            rows.append([change, "NinjaOne", new[1], describe_change(old, new)])
+    last_seen = "" if previous.taken is None else "Last seen " + time.strftime("%m-%d-%Y %H:%M:%S", time.localtime(previous.taken))
+    for key, old in previous.ninja.items():
+        if key not in current.ninja:
+            rows.append(["removed", "NinjaOne", old[1], last_seen])
+
+    for key, new in current.ad.items():
+        old = previous.ad.get(key)
+        if old is None:
+            rows.append(["added", "Domain", new[1], "In NinjaOne" if new[2] else "No NinjaOne agent"])
+        elif old[2] and not new[2]:
+            rows.append(["changed", "Domain", new[1], "No longer in NinjaOne"])
+        elif old[0] != new[0]:
+            rows.append(["changed", "Domain", new[1], "DNS name or IP address changed"])
+    for key, old in previous.ad.items():
+        if key not in current.ad:
+            rows.append(["removed", "Domain", old[1], last_seen])
+
+    return rows
+
+
+# How many rows of each kind of change there are, ie. {"added": 3, "removed": 1}
+def summary(rows):
+    counts = {}
+    for row in rows:
+        counts[row[0]] = counts.get(row[0], 0) + 1
+    return counts
@@ -0,0 +1,108 @@
+# NinjaOneToolKit - Devices
+# A compact record for each NinjaOne device and a table of them that can be looked up by id, name, serial or DNS name
+
+import sys
+from datetime import datetime
+
+import reconcile
+
+
+class Device:
+    # Slots keep each device to a fixed handful of references instead of a per instance dict
+    __slots__ = ("name", "id", "status", "os", "brand", "model", "serial", "memory", "processor", "last_login", "last_boot", "org", "dns", "ip")
+
+    def __init__(self, name, id, status, os, brand, model, serial, memory, processor, last_login, last_boot, org=None, dns=None, ip=None):
+        self.name = name
+        self.id = id
+        # The same handful of statuses, OS names, brands, models and processors repeat across a fleet, so they are interned
+        self.status = intern(status)
+        self.os = intern(os)
+        self.brand = intern(brand)
+        self.model = intern(model)
+        self.serial = serial
+        self.memory = memory
+        self.processor = intern(processor)
+        self.last_login = last_login
+        self.last_boot = last_boot
+        self.org = org
+        self.dns = dns # Only used for matching against the domain, so not part of row()
+        self.ip = ip
+
+    # Pull the values we use out of a single devices-detailed record in one pass, any missing values are filled with N/A
+    @classmethod
+    def from_api(cls, k, org=None):
+        system = k.get("system") or {}
+        os_info = k.get("os") or {}
+        memory = k.get("memory") or {}
+        processors = k.get("processors") or [{}]
+        ips = k.get("ipAddresses") or []
+
+        return cls(
+            str(k["systemName"]) if "systemName" in k else "N/A",
+            int(k["id"]) if "id" in k else 0,
+            ("Offline" if str(k["offline"]) == "True" else "Online") if "offline" in k else "N/A",
+            str(os_info["name"]) if "name" in os_info else "N/A",
+            str(system["manufacturer"]) if "manufacturer" in system else "N/A",
+            str(system["model"]) if "model" in system else "N/A",
+            str(system["serialNumber"]) if "serialNumber" in system else "N/A",
+            round(int(memory["capacity"])/(1024 ** 3)) if "capacity" in memory else "N/A",
+            str(processors[0]["name"]) if "name" in processors[0] else "N/A",
+            str(k["lastLoggedInUser"]) if "lastLoggedInUser" in k else "N/A",
+            datetime.fromtimestamp(int(os_info["lastBootTime"])).strftime('%m-%d-%Y %H:%M:%S') if "lastBootTime" in os_info else "N/A",
+            org,
+            str(k["dnsName"]) if k.get("dnsName") else None,
+            str(ips[0]) if len(ips) > 0 else None,
+        )
+
+    # Build a device from a row in row() order, optionally followed by match_row(), ie. from the snapshot store
+    @classmethod
+    def from_row(cls, row, org=None):
+        extra = list(row[11:13]) + [None, None]
+        return cls(*row[:11], org=org, dns=extra[0], ip=extra[1])
+
+    # The device as a row for tables and the snapshot store, in the same order as main.device_header
+    def row(self):
+        return [self.name, self.id, self.status, self.os, self.brand, self.model, self.serial, self.memory, self.processor, self.last_login, self.last_boot]
+
+    # The extra values used to match the device against the domain, stored after row() in the snapshot
+    def match_row(self):
+        return [self.dns, self.ip]
+
+
+def intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+# Every device gathered from NinjaOne in the order it arrived, with lookups by id, name and serial
+class DeviceTable:
+    def __init__(self):
+        self.devices = []
+        self.by_id = {}
+        self.name_index = None # reconcile.DeviceIndex over names, serials, DNS names and IPs, built on first lookup
+
+    def add(self, device):
+        self.by_id[device.id] = len(self.devices)
+        self.devices.append(device)
+        self.name_index = None
+
+    def __iter__(self):
+        return iter(self.devices)
+
+    def __len__(self):
+        return len(self.devices)
+
+    # Normalized name/serial/DNS indexes, shared with the reconciliation so they are only built once per set of devices
+    def index(self):
+        if self.name_index is None:
+            self.name_index = reconcile.DeviceIndex([d.name for d in self.devices], [d.serial for d in self.devices],
+                                                    dns=[d.dns for d in self.devices], ips=[d.ip for d in self.devices])
+        return self.name_index
+
+    def get(self, dev_id):
+        i = self.by_id.get(dev_id)
+        return None if i is None else self.devices[i]
+
+    # Find a device by name (case insensitive, without FQDN suffix) and/or serial number
+    def find(self, name=None, serial=None):
+        i = self.index().find(name, serial)
+        return None if i is None else self.devices[i]
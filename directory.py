@@ -0,0 +1,110 @@
+# NinjaOneToolKit - Directory sources
+# Pluggable ways of listing the computers in Active Directory, every source yields [name, dns name, ip] rows as a stream
+# - PowerShellSource : Get-ADComputer exported to CSV (Windows only, the original behaviour)
+# - LdapSource       : paged LDAP search straight against a domain controller (needs ldap3)
+# - FileSource       : reads a CSV export, a stand-in for testing away from the domain
+
+import os
+import csv
+import socket
+import subprocess
+
+
+# Read a Get-ADComputer style CSV export, columns are looked up by name so the column order doesn't matter
+def read_computer_csv(path):
+    with open(path, 'r', newline='') as csvfile:
+        lines = (line for line in csvfile if not line.startswith("#TYPE")) # Export-Csv adds a type line above the header
+        reader = csv.DictReader(lines)
+        for row in reader:
+            row = {key.lower(): value for key, value in row.items() if key is not None}
+            yield [row.get("name", ""), row.get("dnshostname", ""), row.get("ipv4address", "")]
+
+
+class FileSource:
+    def __init__(self, path):
+        self.path = path
+
+    def computers(self):
+        return read_computer_csv(self.path)
+
+
+class PowerShellSource:
+    def __init__(self, csv_path):
+        self.csv_path = csv_path
+
+    def computers(self):
+        # First gather all devices via Get-ADComp cmdlet then parse the information from the CSV
+        cmd = " Get-ADComputer -Filter * -Properties IPv4Address | Export-Csv " + self.csv_path
+        p = subprocess.Popen('powershell -command' + cmd)
+        p.communicate()
+        return read_computer_csv(self.csv_path)
+
+
+class LdapSource:
+    # Only the attributes we actually use are requested, IPv4 isn't stored in AD so it is resolved from the DNS name when asked
+    attributes = ["name", "dNSHostName"]
+
+    def __init__(self, server, base_dn, user=None, password=None, use_ssl=True, page_size=1000, resolve_ips=False):
+        self.server = server
+        self.base_dn = base_dn
+        self.user = user
+        self.password = password
+        self.use_ssl = use_ssl
+        self.page_size = page_size
+        self.resolve_ips = resolve_ips
+
+    def computers(self):
+        try:
+            import ldap3
+        except ImportError:
+            raise ImportError("The LDAP directory source needs the ldap3 package, install it with pip3 install ldap3")
+
+        server = ldap3.Server(self.server, use_ssl=self.use_ssl, get_info=ldap3.NONE)
+        authentication = ldap3.NTLM if self.user and "\\" in self.user else ldap3.SIMPLE
+        conn = ldap3.Connection(server, user=self.user, password=self.password, authentication=authentication,
+                                auto_bind=True, read_only=True)
+        try:
+            # The paged search asks the domain controller for page_size entries at a time and hands them back as they arrive
+            entries = conn.extend.standard.paged_search(self.base_dn, "(objectClass=computer)", search_scope=ldap3.SUBTREE,
+                                                        attributes=self.attributes, paged_size=self.page_size, generator=True)
+            for entry in entries:
+                if entry.get("type") != "searchResEntry":
+                    continue
+                attributes = entry.get("attributes", {})
+                name = first(attributes.get("name"))
+                dns = first(attributes.get("dNSHostName"))
+                yield [name, dns, self.resolve(dns)]
+        finally:
+            conn.unbind()
+
+    def resolve(self, dns):
+        if not self.resolve_ips or dns == "":
+            return ""
+        try:
+            return socket.gethostbyname(dns)
+        except OSError:
+            return ""
+
+
+# LDAP attributes can come back as a single value or a list of values depending on the schema
+def first(value):
+    if isinstance(value, (list, tuple)):
+        value = value[0] if len(value) > 0 else ""
+    return "" if value is None else str(value)
+
+
+# Build the directory source named by AD_SOURCE (powershell, ldap or file) from the settings in .env
+# csv_name is the file the PowerShell export is written to (and the default file read), one per tenant
+def source_from_env(cwd=None, csv_name="computers.csv"):
+    cwd = cwd or os.getcwd()
+    kind = (os.getenv('AD_SOURCE') or "powershell").lower()
+
+    if kind == "ldap":
+        return LdapSource(os.getenv('AD_LDAP_SERVER'), os.getenv('AD_LDAP_BASE_DN'), os.getenv('AD_LDAP_USER'), os.getenv('AD_LDAP_PASSWORD'),
+                          use_ssl=(os.getenv('AD_LDAP_SSL') or "true").lower() == "true",
+                          page_size=int(os.getenv('AD_LDAP_PAGE_SIZE') or 1000),
+                          resolve_ips=(os.getenv('AD_RESOLVE_IPS') or "false").lower() == "true")
+    elif kind == "file":
+        return FileSource(os.getenv('AD_FILE_PATH') or cwd + "\\" + csv_name)
+    else:
+        return PowerShellSource(cwd + "\\" + csv_name)
@@ -0,0 +1,171 @@
+# NinjaOneToolKit - Device enrichment
+# Adds per-device details (disks, installed software, patch state, last activity) that devices-detailed doesn't return
+# - Every detail is its own request per device, so requests fan out over a bounded pool of workers sharing the pooled client
+# - Details are cached with a TTL (in memory, and in the snapshot store when there is one) so reruns skip devices that were just fetched
+# - The same device/detail is only ever requested once at a time, a second ask waits on the request already in flight
+# - stream() yields each device as soon as all of its details are in, so the export can write rows while the rest are still fetching
+
+import time
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, Future
+
+
+# Detail name : (endpoint relative to the v2 API with {id} for the device id, query params)
+endpoints = {
+    "disks": ("device/{id}/disks", None),
+    "software": ("device/{id}/software", None),
+    "patches": ("device/{id}/os-patches", None),
+    "activity": ("device/{id}/activities", {"pageSize": 1}),
+}
+
+# Column headers for each detail, in the order details are added to a row
+headers = {"disks": "Disks", "software": "Installed Software", "patches": "Pending Patches", "activity": "Last Activity"}
+
+pending_patch_states = ("PENDING", "MANUAL", "APPROVED", "FAILED")
+
+
+# Reduce each detail response to a single value for a table cell, so only that is cached and held in memory
+def summarize_disks(data):
+    disks = []
+    for disk in data or []:
+        size = disk.get("size")
+        disks.append(" ".join(str(part) for part in (disk.get("mediaType"), str(round(size / 1000 ** 3)) + " GB" if size else None) if part))
+    return "; ".join(disks)
+
+
+def summarize_software(data):
+    return len(data or [])
+
+
+def summarize_patches(data):
+    return len([patch for patch in data or [] if str(patch.get("status", "")).upper() in pending_patch_states])
+
+
+def summarize_activity(data):
+    activities = (data or {}).get("activities") or []
+    if len(activities) == 0 or "activityTime" not in activities[0]:
+        return "N/A"
+    return datetime.fromtimestamp(float(activities[0]["activityTime"])).strftime('%m-%d-%Y %H:%M:%S')
+
+
+summarizers = {"disks": summarize_disks, "software": summarize_software, "patches": summarize_patches, "activity": summarize_activity}
+
+
+class Enricher:
+    def __init__(self, client, token, details=None, workers=16, ttl=86400, store=None):
+        self.client = client
+        self.token = token
+        self.details = [d for d in (details or list(endpoints)) if d in endpoints]
+        self.workers = max(1, workers)
+        self.ttl = ttl
+        self.store = store # SnapshotStore, or None to only cache for this run
+        self.cache = {} # (device id, detail): (fetched at, value)
+        self.unsaved = [] # Cache entries not in the store yet, the store is only written from the thread that owns it
+        self.in_flight = {} # (device id, detail): Future of the request already running
+        self.lock = threading.Lock()
+        self.errors = 0
+
+    # Cached value of a detail if it is younger than the TTL, returns (found, value)
+    def cached(self, device_id, detail):
+        entry = self.cache.get((device_id, detail))
+        if entry is None and self.store is not None:
+            entry = self.store.device_detail(device_id, detail)
+        if entry is not None and time.time() - entry[0] < self.ttl:
+            return True, entry[1]
+        return False, None
+
+    # Request a single detail of a device, this runs inside a worker thread
+    def fetch(self, device_id, detail):
+        path, params = endpoints[detail]
+        try:
+            value = summarizers[detail](self.client.get(path.format(id=device_id), self.token, params))
+        except Exception as Error:
+            with self.lock:
+                self.errors = self.errors + 1
+            return "ERROR: " + str(Error)[:80] # Not cached, so the next run tries again
+
+        with self.lock:
+            self.cache[(device_id, detail)] = (time.time(), value)
+            self.unsaved.append((device_id, detail))
+        return value
+
+    # Get a detail, from the cache, from a request already in flight for it, or with a new request on the executor
+    def submit(self, executor, device_id, detail):
+        key = (device_id, detail)
+        with self.lock:
+            if key in self.in_flight:
+                return self.in_flight[key]
+        found, value = self.cached(device_id, detail)
+        future = Future()
+        if found:
+            future.set_result(value)
+            return future
+        with self.lock:
+            future = self.in_flight[key] = executor.submit(self.fetch, device_id, detail)
+        future.add_done_callback(lambda f: self.done(key))
+        return future
+
+    def done(self, key):
+        with self.lock:
+            self.in_flight.pop(key, None)
+
+    # Save newly fetched details to the snapshot store
+    def flush(self):
+        if self.store is None:
+            return
+        with self.lock:
+            keys = self.unsaved
+            self.unsaved = []
+            entries = [(device_id, detail) + self.cache[(device_id, detail)] for device_id, detail in keys]
+        if len(entries) > 0:
+            self.store.save_device_details(entries)
+
+    # Yield (device, {detail: value}) for every device as soon as all of its details are in, in the order they complete
+    # At most window devices are fetched ahead, so memory stays flat however many devices there are
+    def stream(self, devices, window=None):
+        window = window or self.workers * 4
+        waiting = [] # (device, {detail: future}) in the order they were submitted
+        ready = threading.Condition()
+
+        def wake(future):
+            with ready:
+                ready.notify()
+
+        # Wait for the first device whose details are all in and take it off the waiting list
+        def next_done():
+            with ready:
+                while True:
+                    for item in waiting:
+                        if all(future.done() for future in item[1].values()):
+                            waiting.remove(item)
+                            return item[0], {detail: future.result() for detail, future in item[1].items()}
+                    ready.wait()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            try:
+                for device in devices:
+                    futures = {detail: self.submit(executor, device.id, detail) for detail in self.details}
+                    with ready:
+                        waiting.append((device, futures))
+                    for future in futures.values():
+                        future.add_done_callback(wake)
+
+                    while len(waiting) >= window:
+                        yield next_done()
+                        if len(self.unsaved) >= 1000:
+                            self.flush()
+
+                while len(waiting) > 0:
+                    yield next_done()
+                    if len(self.unsaved) >= 1000:
+                        self.flush()
+            finally:
+                self.flush()
+
+    # The header cells for the details, in the order cells() adds them to a row
+    def header(self):
+        return [headers[detail] for detail in self.details]
+
+    def cells(self, values):
+        return [values[detail] for detail in self.details]
@@ -0,0 +1,187 @@
+# NinjaOneToolKit - Bulk enrollment
+# Pushes the NinjaOne agent to many computers at once
+# - The organization's installer link is fetched from the API once per job and kept in the job file
+# - Installs fan out over a bounded pool of workers, each one runs the executor command for a single host
+# - Every host's state (pending, running, done, failed, skipped) is saved to a JSON job file as it changes,
+#   so an interrupted job picks up where it left off and only failed hosts need to be retried
+# The executor command is a template, {host}, {url}, {org} and {location} are filled in for each host,
+# ie. ENROLL_COMMAND=echo {host} {url} to try a job out locally without touching any computers
+
+import os
+import re
+import json
+import time
+import tempfile
+import threading
+import subprocess
+
+
+states = ["pending", "running", "done", "failed", "skipped"]
+
+# Installs the MSI on a remote computer through PowerShell remoting (WinRM)
+default_command = ('powershell -NoProfile -NonInteractive -Command "Invoke-Command -ComputerName {host} -ScriptBlock {{ '
+                   "$msi = Join-Path $env:TEMP 'NinjaOneAgent.msi'; "
+                   "Invoke-WebRequest -UseBasicParsing -Uri '{url}' -OutFile $msi; "
+                   "$p = Start-Process msiexec.exe -ArgumentList '/i', $msi, '/qn', '/norestart' -Wait -PassThru; "
+                   'exit $p.ExitCode }}"')
+
+# Host names are put into a shell command, so only plain NetBIOS/DNS names are allowed through
+host_pattern = re.compile(r"^[A-Za-z0-9][A-Za-z0-9.\-]{0,252}$")
+
+output_limit = 2000 # Characters of each host's command output kept in the job file
+
+
+class EnrollmentJob:
+    def __init__(self, path, org_id=None, location_id=None, installer_url=None):
+        self.path = path
+        self.org_id = org_id
+        self.location_id = location_id
+        self.installer_url = installer_url
+        self.created = time.time()
+        self.hosts = {} # name: {"state", "attempts", "started", "finished", "returncode", "error", "output"}
+        self.lock = threading.Lock()
+
+    # Load a job from its file, returns None if there isn't one yet
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+
+        job = cls(path, data.get("org_id"), data.get("location_id"), data.get("installer_url"))
+        job.created = data.get("created", job.created)
+        job.hosts = data.get("hosts", {})
+
+        # Anything still running when the last run stopped never finished, so it goes back in the queue
+        for entry in job.hosts.values():
+            if entry["state"] == "running":
+                entry["state"] = "pending"
+        return job
+
+    # Write the job through a temp file and swap it into place, so a crash never leaves a half written job
+    # Held for the whole write so workers finishing at the same time can't swap an older copy into place
+    def save(self):
+        with self.lock:
+            data = {"org_id": self.org_id, "location_id": self.location_id, "installer_url": self.installer_url,
+                    "created": self.created, "updated": time.time(), "hosts": self.hosts}
+
+            folder = os.path.dirname(os.path.abspath(self.path))
+            if not os.path.exists(folder):
+                os.makedirs(folder)
+            fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".enroll-")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(data, f, indent=2)
+                os.replace(tmp_path, self.path)
+            except OSError:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+    # Add hosts to the job, hosts already in it keep their state unless they were skipped. Returns how many were new
+    def add_hosts(self, names):
+        added = 0
+        with self.lock:
+            for name in names:
+                name = str(name).strip()
+                if name != "" and name not in self.hosts:
+                    self.hosts[name] = {"state": "pending", "attempts": 0, "started": None, "finished": None,
+                                        "returncode": None, "error": None, "output": ""}
+                    added = added + 1
+                elif name in self.hosts and self.hosts[name]["state"] == "skipped": # Missing from NinjaOne again
+                    self.hosts[name].update(state="pending", error=None)
+        return added
+
+    # Skip pending and failed hosts that are no longer in names, ie. they have turned up in NinjaOne since the job started
+    # so they are never installed on twice. Returns how many were skipped
+    def skip_hosts_not_in(self, names):
+        wanted = set(str(name).strip().upper() for name in names)
+        skipped = 0
+        with self.lock:
+            for name, entry in self.hosts.items():
+                if entry["state"] in ("pending", "failed") and name.upper() not in wanted:
+                    entry.update(state="skipped", error="No longer missing from NinjaOne")
+                    skipped = skipped + 1
+        return skipped
+
+    # Put failed hosts back in the queue
+    def retry_failed(self):
+        with self.lock:
+            for entry in self.hosts.values():
+                if entry["state"] == "failed":
+                    entry["state"] = "pending"
+
+    def pending(self):
+        with self.lock:
+            return [name for name, entry in self.hosts.items() if entry["state"] == "pending"]
+
+    def counts(self):
+        with self.lock:
+            counts = {state: 0 for state in states}
+            for entry in self.hosts.values():
+                counts[entry["state"]] = counts[entry["state"]] + 1
+            return counts
+
+    def update(self, name, **values):
+        with self.lock:
+            self.hosts[name].update(values)
+        self.save()
+
+    # One row per host for displaying, [host, state, attempts, return code, error]
+    def rows(self):
+        with self.lock:
+            return [[name, e["state"], e["attempts"], "" if e["returncode"] is None else e["returncode"], e["error"] or ""]
+                    for name, e in sorted(self.hosts.items())]
+
+
+# Fill in the executor command for a host
+def build_command(template, job, host):
+    if not host_pattern.match(host):
+        raise ValueError("Refusing to run the install for " + repr(host) + ", it isn't a valid host name")
+    return template.format(host=host, url=job.installer_url, org=job.org_id, location=job.location_id)
+
+
+# Run the install for a single host and record how it went, this runs inside a worker thread
+def enroll_host(job, host, template, timeout):
+    entry = job.hosts[host]
+    job.update(host, state="running", attempts=entry["attempts"] + 1, started=time.time(), finished=None, returncode=None, error=None)
+
+    try:
+        command = build_command(template, job, host)
+        p = subprocess.run(command, shell=True, capture_output=True, text=True, timeout=timeout)
+        output = (p.stdout + p.stderr).strip()
+        if p.returncode == 0:
+            job.update(host, state="done", finished=time.time(), returncode=0, output=output[-output_limit:])
+        else:
+            job.update(host, state="failed", finished=time.time(), returncode=p.returncode,
+                       error="Exited with " + str(p.returncode), output=output[-output_limit:])
+    except subprocess.TimeoutExpired:
+        job.update(host, state="failed", finished=time.time(), error="Timed out after " + str(timeout) + " seconds")
+    except Exception as Error:
+        job.update(host, state="failed", finished=time.time(), error=str(Error))
+
+    return host, job.hosts[host]["state"]
+
+
+# Install on every pending host, at most workers at a time. progress(host, state) is called as each host finishes
+# Returns how many of the hosts tried in this run ended in each state, hosts done or failed in earlier runs aren't counted
+def run_job(job, template=None, workers=8, timeout=600, progress=None):
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    template = template or default_command
+    hosts = job.pending()
+    counts = {state: 0 for state in states}
+    job.save()
+
+    if len(hosts) > 0:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(hosts)))) as executor:
+            futures = [executor.submit(enroll_host, job, host, template, timeout) for host in hosts]
+            for future in as_completed(futures):
+                host, state = future.result()
+                counts[state] = counts[state] + 1
+                if progress is not None:
+                    progress(host, state)
+
+    return counts
@@ -1,526 +1,1292 @@
-#!/user/bin/env python3
-
-# NinjaOneToolKit
-# Perform a variety of functions related to devices in NinjaOne/Domain
-# Gather values from XLSX Sheet and compare to NinjaOne/Domain
-# Update values in XLSX Sheet to reflect devices in/not in NinjaOne/Domain
-# List devices in and not in NinjaOne/Domain
-# Add devices into NinjaOne/Domain
-# Brayden Kukla - 2024
-
-# Generic libraries
-import os
-import sys
-import csv
-import warnings
-import requests
-import subprocess
-import argparse
-from tabulate import tabulate
-from dotenv import load_dotenv
-from datetime import datetime
-# OpenpyXL libraries
-import openpyxl as xl
-import openpyxl.styles as xlstyle
-from openpyxl.worksheet.table import Table, TableStyleInfo
-from openpyxl.utils import get_column_letter as xlgcl
-
-
-endpoint = "https://app.ninjarmm.com/v2/"
-oauth_url = "https://app.ninjarmm.com/ws/oauth/token"
-
-# Be sure to change the path in .env 
-load_dotenv() 
-
-# Arguements
-parser = argparse.ArgumentParser(description="A CLI Application for IT Technicians to access and manage Organizations & Devices in NinjaOne(NinjaRMM) straight from the Command Line", 
-                                 prog="NinjaOneToolKit", usage="python3 main.py [options]")
-# parser.add_argument('-f', '--file', type=str, help="The XLSX file you wish to compare results from Ninja & AD to...", required=False)
-# parser.add_argument('-gf', '--generate-file', help="Use this flag if you wish to generate a XLSX file of results...", action='store_true')
-
-args = parser.parse_args()
-
-# This is the ID of the organization in NinjaOne that your account running the scripts domain  
-domain_org_id = os.getenv('DOMAIN_ORG_ID')
-
-# This is specifically to ignore the random warning that is generated when accessing the worksheet via openpyxl (does not affect the script)
-warnings.simplefilter('ignore')
-
-user_sel = ''
-
-
-# Call api endpoint for bearer token, currently this is just uses a machine-to-machine application using client credentials
-def get_token():
-    data = {
-        "grant_type": "client_credentials",
-        "client_id": str(os.getenv('CLIENT_ID')),
-        "client_secret": str(os.getenv('CLIENT_SECRET')),
-        "scope": "monitoring"
-    }
-
-    headers = {"Content-Type": "application/x-www-form-urlencoded"}
-
-    token = requests.post(oauth_url, data, headers).json()
-
-    global api_token
-    api_token = token["access_token"]
-
-
-# Get organizations assocaited in NinjaOne
-def get_orgs(token):
-    global orgs
-    global orgs_id
-    global user_sel
-    
-    org_url = endpoint + "organizations/"
-
-    headers = {
-        "Accept": "application/json",
-        "Authorization": "Bearer " + token,
-    }
-
-    organizations = requests.get(org_url, headers=headers).json()
-
-    orgs = []
-    orgs_id = []
-
-    print('-'*80 + "\nOrganizations\n" + '-'*80 + '\n')
-
-    c = 0
-    for org in organizations:
-        c = c + 1
-        print(str(c) + ". " + str(org["name"]))
-        orgs.append(org["name"])
-        orgs_id.append(org["id"])
-
-    print('\n')
-
-    sel =  input("Please select an organization " + "(1-" + str(len(organizations)) + ")... ")
-    user_sel = orgs_id[int(sel)-1] # We want the user_sel to be the organization id that they selected, since the ids may not be in numerical order
-    print("ORGANIZATION ID : ", str(user_sel))
-    get_devices_detailed(token)
-
-
-# Get detailed information on devices
-def get_devices_detailed(token):
-    data = [] # Array to store values for displaying in tabulate table
-    header = ["System Name", "ID", "Status", "OS", "Brand", "Model", "Serial Number", "Memory", "Processor", "Last Login", "Last Boot Time"] #Headers for tabulate table columns
-
-    headers = {
-        "Accept": "application/json",
-        "Authorization": "Bearer " + token,
-    }
-
-    # Using the built in device filter param to only get detailed info for devices in a specific org
-    device_url = endpoint + "devices-detailed/" + "?df=org=" + (str(user_sel) if str(user_sel) != "" else domain_org_id)
-    devices = requests.get(device_url, headers=headers).json()
-
-    global ninja_ids
-    global ninja_system_names 
-    global ninja_status
-    global ninja_os_names
-    global ninja_system_brands
-    global ninja_system_models
-    global ninja_system_serials
-    global ninja_system_memory
-    global ninja_processors
-    global ninja_last_login
-    global ninja_last_boot
-
-    ninja_ids = []
-    ninja_system_names = []
-    ninja_status = []
-    ninja_os_names = []
-    ninja_system_brands = []
-    ninja_system_models = []
-    ninja_system_serials = []
-    ninja_system_memory = []
-    ninja_processors = []
-    ninja_last_login = []
-    ninja_last_boot = []
-
-    print('\n' + '-'*80 + "\nDevices in NinjaOne...\n" + '-'*80)
-
-    if len(devices) >= 1:
-        for k in devices:
-            try:
-                dev_id = (int(k["id"])) if "id" in k else ninja_ids.append(0)
-                name = (str(k["systemName"])) if "systemName" in k else ninja_system_names.append("N/A")
-                status = "Offline" if (str(k["offline"])) == "True" else "Online" if "offline" in k else ninja_status.append("N/A")
-                os = (str(k["os"]["name"])) if "os" in k else ninja_os_names.append("N/A")
-                manufacturer = (str(k["system"]["manufacturer"])) if "system" in k and "manufacturer" in k["system"] else ninja_system_names.append("N/A")
-                model = (str(k["system"]["model"])) if "system" in k and "model" in k["system"] else ninja_system_models.append("N/A")
-                serial = (str(k["system"]["serialNumber"])) if "system" in k and "serialNumber" in k["system"] else ninja_system_serials.append("N/A")
-                memory = (round((int(k["memory"]["capacity"]))/(1024 ** 3))) if "memory" in k and "capacity" in k["memory"] else ninja_system_memory.append("N/A")
-                processor = (str(k["processors"][0]["name"])) if "processors" in k and "name" in k["processors"][0] else ninja_processors.append("N/A")
-                last_login = (str(k["lastLoggedInUser"])) if "lastLoggedInUser" in k else ninja_last_login.append("N/A")
-                last_boot = (datetime.fromtimestamp(int(k["os"]["lastBootTime"])).strftime('%m-%d-%Y %H:%M:%S')) if "os" in k and "lastBootTime" in k["os"] else ninja_last_boot.append("N/A")
-
-                ninja_ids.append(dev_id)
-                ninja_system_names.append(name)
-                ninja_status.append(status)
-                ninja_os_names.append(os)
-                ninja_system_brands.append(manufacturer)
-                ninja_system_models.append(model)
-                ninja_system_serials.append(serial)
-                ninja_system_memory.append(memory)
-                ninja_processors.append(processor)
-                ninja_last_login.append(last_login)
-                ninja_last_boot.append(last_boot)
-
-                data.append([name, dev_id, status, os, manufacturer, model, serial, memory, processor, last_login, last_boot])
-            except Exception as Error:
-                print("ERROR: ", Error)
-
-        print(tabulate(data, headers=header, tablefmt='simple_grid'))
-    else:
-        print("\nThere are no devices currently associated with this organization...\n")
-        sys.exit()
-
-
-# Load excel sheet and gather device info
-def get_excel_data():
-    global wb
-    global ws
-    global path
-    global xl_ids
-    global xl_system_names 
-    global xl_row_num
-    global xl_ninja_statuses
-    global xl_domain_statuses
-
-    # Initialize workbook
-    path = os.getenv('XL_PATH')
-    wb = xl.load_workbook(path)
-    ws = wb[str(os.getenv('XL_WORKSHEET_NAME'))]
-
-    xl_ids = []
-    xl_system_names = []
-    xl_row_num = []
-    xl_ninja_statuses = []
-    xl_domain_statuses = []
-
-    l = 1
-    # Iterate through the sheet to save values
-    for row in ws.iter_rows(min_row=int(os.getenv('XL_MIN_ROW')), max_row=int(os.getenv('XL_MAX_ROW')), values_only=True):
-        if row[0] == None:
-            pass
-        else:
-            l = l + 1
-            xl_ids.append(row[int(os.getenv('XL_ID_COL'))])
-            xl_system_names.append(row[int(os.getenv('XL_SYS_NAME_COL'))])
-            xl_row_num.append(l)
-            xl_ninja_statuses.append(row[int(os.getenv('XL_NINJA_STATUS_COL'))])
-            xl_domain_statuses.append(row[int(os.getenv('XL_DOMAIN_STATUS_COL'))])
-
-
-# Compare results of devices in NinjaOne to the Excel File and update values in the "Computers" sheet
-def compare_res():
-    ad_missing = []
-    ninja_missing = []
-    data = [] #Array to store values for displaying in tabulate table
-    header = ["Device","In Domain?", "In Ninja?"] #Headers for tabulate table columns    
-    both = []
-
-    print('\n' + '-'*80 + "\nDevices In The Excel File And Their Statuses In NinjaOne & Domain...\n" + '-'*80)
-
-    for i in range(len(xl_system_names)):
-        if in_domain(xl_system_names[i]) == False:
-            ad_missing.append(xl_system_names[i])
-            ws[str(os.getenv('XL_DOMAIN_STATUS_COL_LETTER'))+str(xl_row_num[i])] = 'N'
-            if in_ninja(xl_system_names[i]) == False :
-                ninja_missing.append((xl_system_names[i]))
-                ws[str(os.getenv('XL_NINJA_STATUS_COL_LETTER'))+str(xl_row_num[i])] = 'N'
-            else:
-                ws[str(os.getenv('XL_NINJA_STATUS_COL_LETTER'))+str(xl_row_num[i])] = 'Y'
-        else:
-            ws[str(os.getenv('XL_DOMAIN_STATUS_COL_LETTER'))+str(xl_row_num[i])] = 'Y'
-            if in_ninja(xl_system_names[i]) == False:
-                ninja_missing.append(xl_system_names[i])
-                ws[str(os.getenv('XL_NINJA_STATUS_COL_LETTER'))+str(xl_row_num[i])] = 'N'
-            else:
-                ws[str(os.getenv('XL_NINJA_STATUS_COL_LETTER'))+str(xl_row_num[i])] = 'Y'
-
-        data.append([xl_system_names[i], 'YES' if in_domain(xl_system_names[i]) else 'NO', 'YES' if in_ninja(xl_system_names[i]) else 'NO'])
-    
-    print(tabulate(data, headers=header, tablefmt='double_grid'))
-
-    # Which devices are missing from NinjaOne & Domain
-    for d in range(len(ninja_missing)):
-        if ninja_missing[d] in ad_missing:
-            both.append(ninja_missing[d])
-
-    #Write to the log file and save changes made to the workbook
-    write_to_file(ninja_missing, ad_missing, both)
-    wb.save(path)
-
-
-# Generate an excel file with all devices in a specified organization and their information
-def generate_xlsx():
-
-    print("Generating XLSX file with results of devices in Ninja...")
-
-    # Initizlize & create workbook/worksheet
-    wb = xl.Workbook()
-    ws = wb.active
-
-    # First lets add our headers to the XLSX file
-    ws['A1'] = "System Name"
-    ws['B1'] = "Status"
-    ws['C1'] = "OS"
-    ws['D1'] = "Brand"
-    ws['E1'] = "Model"
-    ws['F1'] = "Serial #"
-    ws['G1'] = "Memory (GB)"
-    ws['H1'] = "Processor"
-    ws['I1'] = "Last Login"
-    ws['J1'] = "Last Boot Time"
-    ws['K1'] = "In Ninja?"
-    ws['L1'] = "In Domain?"
-
-    # Iterate through the sheet to save values
-    rownum = 1
-    try: 
-        for i in range(0,len(ninja_system_names)) :
-            rownum = rownum + 1
-            ws["A" + str(rownum)] = ninja_system_names[i]
-            ws["B" + str(rownum)] = ninja_status[i]
-            ws["C" + str(rownum)] = ninja_os_names[i]
-            ws["D" + str(rownum)] = ninja_system_brands[i]
-            ws["E" + str(rownum)] = ninja_system_models[i]
-            ws["F" + str(rownum)] = ninja_system_serials[i]
-            ws["G" + str(rownum)] = ninja_system_memory[i]
-            ws["H" + str(rownum)] = ninja_processors[i]
-            ws["I" + str(rownum)] = ninja_last_login[i]
-            ws["J" + str(rownum)] = ninja_last_boot[i]
-            ws["K" + str(rownum)] = "Y" if in_ninja(ninja_system_names[i]) else "N"
-            ws["L" + str(rownum)] = "Y" if in_domain(ninja_system_names[i]) else "N"
-        
-        # Now lets attempt to format the sheet
-        try: 
-            # Create and style table
-            table = Table(displayName='NinjaDevices', ref='A1:' + xlgcl(ws.max_column) + str(ws.max_row))
-            table.tableStyleInfo = TableStyleInfo(name="TableStyle", showFirstColumn=True, showLastColumn=True,
-                                showRowStripes=True, showColumnStripes=True)
-            ws.add_table(table)  
-
-            for row in ws.iter_rows(): # Lets set the allignment properties
-                for cell in row:
-                    cell.alignment = xlstyle.Alignment(vertical='center', horizontal='center')
-
-            for column in ws.columns: # Now lets set the column widths
-                length = 0
-                letter =  column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > length:
-                            length = len(cell.value)
-                    except:
-                        pass
-                width = (length + 2) # Add a little extra room in the cell to work with
-                ws.column_dimensions[letter].width = width
-        except Exception as Error:
-            print("\nERROR: Unable to format XLSX file - ", Error)  
-
-        # Lets make a note of any devices not in Ninja
-        device_in_domain_not_ninja()
-        rownum = rownum + 5
-        ws["A" + str(rownum)] = "NOTE : Devices NOT in Ninja but in the Domain..."
-        for d in range(len(devices_in_domain_not_ninja)):
-            rownum = rownum + 1
-            ws["A" + str(rownum)] = devices_in_domain_not_ninja[d]
-
-        # Concat the selected org name with the file name, user_sel is the selected orgs id, run a function to get the org name from its ID
-        org_name = orgs[orgs_id.index(user_sel)]
-        wb_name = org_name.replace(" ", "-") + "-Ninja-Devices-" + str(datetime.now().strftime("%Y-%m-%d-%H-%M")) + ".xlsx"
-        
-        folder_path = os.getcwd() + "\\XLSX Results\\" 
-        full_path =  folder_path + wb_name
-
-        if not os.path.exists(folder_path): # Lets check if the folder already exists first
-            os.mkdir(os.getcwd() + "\\XLSX Results")
-
-        wb.save(full_path) # Finally lets save the workbook
-
-        print("\nSuccessfully generated XLSX file, file can be found at..." + full_path + "\n")
-    except Exception as Error:
-        print("ERROR: Unable to generate XLSX file - ", Error)
-
-
-# Get all computers associated with Active Directory
-def get_ad_computers():
-    # First gather all devices via Get-ADComp cmdlet then parse the information from the CSV
-    cmd = " Get-ADComputer -Filter * -Properties IPv4Address | Export-Csv " + os.getcwd() + "\\computers.csv"
-    p = subprocess.Popen('powershell -command' + cmd)
-    p.communicate()
-
-    # Now let's parse the CSV and check/store values for later comparisons
-    data = [] #Array to store values for displaying in tabulate table
-    header = ["System Name", "DNS Name", "IP Address"] #Headers for tabulate table columns1
-    file = os.getcwd() + "\\computers.csv"
-
-    global ad_rows
-    global ad_dns
-    global ad_ips
-    global ad_names
-
-    ad_rows = []
-    ad_dns = []
-    ad_ips = []
-    ad_names = []
-
-    try:
-        with open(file, 'r') as csvfile:
-            reader = csv.reader(csvfile)
-            
-            for row in reader:
-                ad_rows.append(row)
-
-            # This just deletes the first 2 items in the list to get rid of the bullshit info we dont want
-            for i in range(2):
-                ad_rows.pop(0)
-
-            print('\n' + '-'*80 + "\nDevices in the Domain...\n" + '-'*80)
-
-            for row in ad_rows:
-                ad_names.append(row[4])
-                ad_dns.append(row[1])
-                if row[3] == '': # Some of the IPs are unknown in the domain for some reason, this is just to check 
-                    ad_ips.append('   UNKNOWN  ')
-                else:
-                    ad_ips.append(row[3])
-                data.append([row[4], row[1], 'UNKNOWN' if row[3] == '' else row[3]])
-
-            print(tabulate(data, headers=header, tablefmt="double_grid"))    
-    except FileNotFoundError:
-        print("ERROR: CSV file not found...")
-
-
-# WIP : Add device to NinjaOne Organization
-def add_to_ninja():
-    if os.path.exists(str(os.getenv('INSTALL_PATH'))):
-        cmd = ""
-        p = subprocess.Popen('powershell -command' + cmd)
-        p.communicate
-
-
-#Comparison functions
-def in_ninja(device):
-    if device in ninja_system_names:
-        return True
-    else:
-        return False
-
-
-def in_domain(device):
-    if device in ad_names:
-        return True
-    else:
-        return False
-
-
-# Write results to results.txt file in the specified log path
-def write_to_file(ninja_missing, ad_missing, both):
-
-    dev_lbl = "Device: "
-    folder_path = os.getcwd() + "\\Logs\\"
-    file_path = os.path.join(folder_path, "results.txt")
-
-    if not os.path.exists(folder_path): # Lets check if our file already exists...
-        os.mkdir(folder_path)
-    else:
-        pass
-
-    try:    
-        with open(file_path, "w") as f:
-            f.write("NinjaOne\n" + "------------\n")
-            for i in range(len(ninja_missing)):
-                f.write(dev_lbl + ninja_missing[i] + " has NOT yet joined NinjaOne... \n")
-            f.write("\nDomain\n" + "--------\n")
-            for d in range(len(ad_missing)):
-                f.write(dev_lbl + ad_missing[d] + " has NOT yet joined the Domain... \n")
-            f.write("\nNinjaOne & Domain\n" + "----------------\n")
-            for k in range(len(both)):
-                f.write(dev_lbl + both[k] + " has NOT yet joined the Domain or NinjaOne... \n")
-            f.write("\nSUCCESS: Script completed at - " + str(datetime.now()))
-
-            print('-'*80 + "\n\nSUCCESS: Results have been saved in " + file_path + '...\n')   
-
-    except FileNotFoundError:
-        print("\nERROR: File not found. Unable to create log file and/or log folder, please check permissions on your CWD...\n")  
-
-
-def device_in_ninja_not_domain():
-    data = []
-    header = ["System Name"]
-
-    for i in range(len(ninja_system_names)):
-        if not in_domain(ninja_system_names[i]):
-            data.append([ninja_system_names[i]])
-        else:
-            pass
-
-    print("\nDevices in NinjaOne but NOT the domain...\n")
-    print(tabulate(data, headers=header, tablefmt='double_grid'))
-
-
-def device_in_domain_not_ninja():
-    global devices_in_domain_not_ninja
-    devices_in_domain_not_ninja = []
-    data = []
-    header = ["System Name"]
-    
-    for i in range(len(ad_names)):
-        name = str(ad_names[i])
-        print(name[0:3].upper())  # We are going to be ignoring any of the servers
-        if not in_ninja(name) and name[0:3].upper() != 'RRC':
-            devices_in_domain_not_ninja.append(name)
-            data.append([name])
-        else:
-            pass
-    print("\nDevices in the domain but NOT NinjaOne...\n")
-    print(tabulate(data, headers=header, tablefmt='double_grid'))
-
-
-# Main
-def main():
-    get_token()
-    print("\nStarting NinjaOneToolKit v.1.1...")   
-    print('-'*80 + "\n 1: List all devices in Ninja\n", "2: List all devices in the domain\n", "3: List all devices that are in Ninja but NOT the domain\n", 
-          "4: List all devices that are in the domain but NOT Ninja\n", "5: List devices in Ninja & the domain and compare with XLSX file\n", 
-          "6: Generate XLSX file of devices in Ninja\n", "7: Add computer to NinjaOne (WIP)\n")
-
-    choice = int(input("Please select an option from the list above (1-5)... "))
-    
-    if choice == 1: # List all devices in NinjaOne
-        get_orgs(api_token)
-    elif choice == 2: # List all devices in the Domain
-        get_ad_computers()
-    elif choice == 3: # List all devices that are in Ninja but NOT the domain
-        get_ad_computers()
-        get_devices_detailed(api_token)
-        device_in_ninja_not_domain()
-    elif choice == 4: # List all devices that are in the domain but NOT Ninja
-        get_ad_computers()
-        get_devices_detailed(api_token)
-        device_in_domain_not_ninja()    
-    elif choice == 5: # Get devices in NinjaOne and the Domain and compare with the XLSX Sheet
-        get_ad_computers()
-        get_devices_detailed(api_token)  
-        get_excel_data()
-        compare_res()
-    elif choice == 6: # Generate XLSX file from results of devicves in Ninja
-        get_orgs(api_token)
-        get_ad_computers()
-        generate_xlsx()
-    elif choice == 7: # Add computer to NinjaOne
-        print("\nThis feature is currently being developed and is unavailable...")
-    else:
-        print("\nERROR: Please re-run the script and enter a valid value, 1-5")
-
-
-if __name__=="__main__":
-    main()
-else:
-    print("ERROR: Unknown error occurred, exiting...\n")
-    sys.exit()
\ No newline at end of file
+#!/user/bin/env python3
+
+# NinjaOneToolKit
+# Perform a variety of functions related to devices in NinjaOne/Domain
+# Gather values from XLSX Sheet and compare to NinjaOne/Domain
+# Update values in XLSX Sheet to reflect devices in/not in NinjaOne/Domain
+# List devices in and not in NinjaOne/Domain
+# Add devices into NinjaOne/Domain
+# Brayden Kukla - 2024
+
+# Generic libraries
+# Only light modules are imported up front, the heavy ones (openpyxl, requests, tabulate, sqlite3) are imported by
+# the functions that need them so options that never touch them start quickly
+import os
+import sys
+import warnings
+import argparse
+import contextlib
+from datetime import datetime
+# NinjaOneToolKit modules
+import reconcile
+import output
+import metrics
+from devices import Device, DeviceTable
+
+
+endpoint = "https://app.ninjarmm.com/v2/"
+oauth_url = "https://app.ninjarmm.com/ws/oauth/token"
+
+
+# Arguements
+def build_parser():
+    parser = argparse.ArgumentParser(description="A CLI Application for IT Technicians to access and manage Organizations & Devices in NinjaOne(NinjaRMM) straight from the Command Line", 
+                                     prog="NinjaOneToolKit", usage="python3 main.py [options] [command]",
+                                     epilog="Run without a command to use the interactive menu")
+    # parser.add_argument('-f', '--file', type=str, help="The XLSX file you wish to compare results from Ninja & AD to...", required=False)
+    # parser.add_argument('-gf', '--generate-file', help="Use this flag if you wish to generate a XLSX file of results...", action='store_true')
+    parser.add_argument('-r', '--refresh', help="Ignore the local snapshot and refresh it from NinjaOne & the Domain...", action='store_true')
+    parser.add_argument('--profile', help="Show how long each phase and API endpoint took when the run finishes...", action='store_true')
+    parser.add_argument('--metrics', metavar="PATH", help="Write timings, API metrics and peak memory to PATH, as JSON (.json) or a Prometheus textfile (.prom)...")
+    parser.add_argument('-t', '--tenant', action='append', metavar="NAME", help="Use the tenant profile in PROFILES_DIR/NAME.env, repeat or separate with commas (or 'all') to run a command for several tenants at once...")
+
+    # Cutting results down, these work before a command or after it (and for the menu's tables)
+    def add_table_options(p, default=None):
+        p.add_argument('--limit', type=int, metavar="N", default=default, help="Only show the first N rows...")
+        p.add_argument('--columns', metavar="COLUMNS", default=default, help="Only show these columns, names or numbers separated by commas, ie. 'System Name,Status' or 1,3...")
+    add_table_options(parser)
+
+    # Commands for running without the menu, ie. from cron or in a pipeline
+    subparsers = parser.add_subparsers(dest="command", title="commands", metavar="command")
+
+    def add_command(name, help, default_format="table", orgs=True):
+        p = subparsers.add_parser(name, help=help, description=help)
+        if orgs:
+            p.add_argument('--org', action='append', metavar="ORG", help="Organization id or name, repeat or separate with commas for more than one, 'all' for every organization (defaults to DOMAIN_ORG_ID)")
+        p.add_argument('-f', '--format', choices=output.formats, default=default_format, help="Output format, tables are written as tab separated rows when not going to a terminal (default: " + default_format + ")")
+        p.add_argument('-o', '--output', metavar="PATH", help="Write the results to a file instead of stdout")
+        add_table_options(p, argparse.SUPPRESS) # So an option given before the command isn't reset by the command
+        return p
+
+    def add_enrich(p):
+        p.add_argument('--enrich', help="Add disks, installed software, pending patches and last activity from the per device endpoints (slower, see ENRICH_DETAILS)", action='store_true')
+        return p
+
+    add_enrich(add_command('devices', "List devices in NinjaOne"))
+    add_command('ad', "List computers in the domain", orgs=False)
+    add_enrich(add_command('diff', "List devices that are only in NinjaOne or only in the domain")).add_argument(
+        '--only', choices=["ninja", "domain"], help="Only list devices that are just in NinjaOne (ninja) or just in the domain (domain)")
+    add_command('reconcile', "Compare the XLSX sheet with NinjaOne & the domain and update its statuses").add_argument(
+        '--no-write-back', help="Don't update the XLSX sheet or write the results log", action='store_true')
+    add_enrich(add_command('export', "Export devices in NinjaOne with their NinjaOne/domain status", default_format="xlsx"))
+    p = add_command('enroll', "Install the NinjaOne agent on devices in the domain but not NinjaOne (or --hosts), resuming the job file")
+    p.add_argument('--hosts', action='append', metavar="HOST", help="Computers to enroll instead of the ones missing from NinjaOne, repeat or separate with commas")
+    p.add_argument('--job', metavar="PATH", help="Job file that keeps each computer's state (defaults to ENROLL_JOB_PATH)")
+    p.add_argument('--workers', type=int, help="How many computers to install on at the same time (defaults to ENROLL_WORKERS)")
+    p.add_argument('--command', dest="command_template", metavar="TEMPLATE", help="Command run for each computer, {host} {url} {org} and {location} are filled in (defaults to ENROLL_COMMAND)")
+    p.add_argument('--retry-failed', help="Try the computers that failed last time again", action='store_true')
+    p.add_argument('--restart', help="Start a new job instead of resuming the job file", action='store_true')
+    p = add_command('changes', "List devices added, removed or changed in NinjaOne & the domain since the last run")
+    p.add_argument('--state', metavar="PATH", help="File that keeps the fingerprints of the last run (defaults to CHANGES_STATE_PATH)")
+    p.add_argument('--no-save', help="Don't save this run as the one the next run is compared with", action='store_true')
+
+    return parser
+
+# Headers for table columns of device information
+device_header = ["System Name", "ID", "Status", "OS", "Brand", "Model", "Serial Number", "Memory", "Processor", "Last Login", "Last Boot Time"]
+ad_header = ["System Name", "DNS Name", "IP Address"]
+compare_header = ["Device","In Domain?", "In Ninja?", "Domain Match", "Ninja Match"]
+enroll_header = ["Host", "State", "Attempts", "Return Code", "Error"]
+changes_header = ["Change", "Source", "System Name", "Details"]
+export_header = ["System Name", "Status", "OS", "Brand", "Model", "Serial #", "Memory (GB)", "Processor", "Last Login", "Last Boot Time", "In Ninja?", "In Domain?", "Match Confidence"]
+
+user_sel = ''
+refresh = False # Set by --refresh to ignore the local snapshot
+tenant = None # Name of the tenant profile in use, set by --tenant
+table_limit = None # Set by --limit, only the first rows of each table are shown
+table_columns = None # Set by --columns, only these columns of each table are shown
+config = None # Settings from .env, loaded on first use by get_config()
+env_path = None # The .env file settings are read from, None looks for it next to the toolkit
+recon = None # Shared reconciliation of devices in NinjaOne/Domain/XLSX, built on demand by get_reconciliation()
+client = None # Shared NinjaOne API client, created on first use by get_client()
+xl_config = None # XLSX sheet settings, resolved on first use by get_xl_config()
+ninja_devices = DeviceTable() # Every device gathered from NinjaOne, see devices.py
+store = None # Local snapshot store, opened on first use by get_store()
+
+
+# Settings from .env, loaded the first time they are needed rather than when the toolkit is imported
+# Be sure to change the path in .env 
+def get_config():
+    global config
+    if config is None:
+        from dotenv import load_dotenv
+        load_dotenv(env_path)
+
+        config = {
+            # NinjaOne instance, ie. https://eu.ninjarmm.com for the EU region (defaults to app.ninjarmm.com)
+            "instance_url": os.getenv('NINJA_URL') or None,
+            # Tenant profiles, each one is an .env file in this folder that overrides the settings in .env
+            "profiles_dir": os.getenv('PROFILES_DIR') or os.path.join(os.getcwd(), "profiles"),
+            "tenant_workers": int(os.getenv('TENANT_WORKERS') or 8), # How many tenants are run at the same time
+            # This is the ID of the organization in NinjaOne that your account running the scripts domain  
+            "domain_org_id": os.getenv('DOMAIN_ORG_ID'),
+            "client_id": os.getenv('CLIENT_ID'),
+            "client_secret": os.getenv('CLIENT_SECRET'),
+            # Number of devices requested per page from devices-detailed, this also bounds how many devices are held in memory at once
+            "device_page_size": int(os.getenv('DEVICE_PAGE_SIZE') or 1000),
+            # Concurrency settings for sweeping every organization at once
+            "sweep_workers": int(os.getenv('SWEEP_WORKERS') or 8), # How many organizations are fetched at the same time
+            "host_concurrency": int(os.getenv('HOST_CONCURRENCY') or 4), # How many requests may be in flight to a single host
+            "api_max_retries": int(os.getenv('API_MAX_RETRIES') or 5), # How many times a failed (5xx) or rate limited (429) request is retried
+            # HTTP timeouts in seconds so one slow response can't hang the whole run
+            "http_timeout": (float(os.getenv('HTTP_CONNECT_TIMEOUT') or 5), float(os.getenv('HTTP_READ_TIMEOUT') or 30)),
+            # Where OAuth tokens are cached between runs, and how many seconds before expiry a token is refreshed
+            "token_cache_path": os.getenv('TOKEN_CACHE_PATH') or None,
+            "token_refresh_margin": int(os.getenv('TOKEN_REFRESH_MARGIN') or 60),
+            # Local snapshot of organizations, devices and AD computers, options answer from it while it is younger than the TTL (in seconds)
+            "snapshot_path": tenant_path(os.getenv('SNAPSHOT_PATH') or os.path.join(os.getcwd(), "snapshot.db")),
+            "snapshot_ttl": int(os.getenv('SNAPSHOT_TTL') or 900), # Set SNAPSHOT_TTL=0 to turn snapshots off
+            # Bulk enrollment, see enroll.py
+            "enroll_command": os.getenv('ENROLL_COMMAND') or None, # None installs through PowerShell remoting
+            "enroll_workers": int(os.getenv('ENROLL_WORKERS') or 8), # How many computers are installed on at the same time
+            "enroll_timeout": int(os.getenv('ENROLL_TIMEOUT') or 600), # Seconds a single install may take
+            "enroll_job_path": tenant_path(os.getenv('ENROLL_JOB_PATH') or os.path.join(os.getcwd() + "\\Logs\\", "enroll-job.json")),
+            "enroll_installer_type": os.getenv('ENROLL_INSTALLER_TYPE') or "WINDOWS_MSI",
+            "enroll_location_id": os.getenv('ENROLL_LOCATION_ID') or None, # None uses the organization's first location
+            # Device matching, see reconcile.py
+            "match_threshold": float(os.getenv('MATCH_THRESHOLD') or 0.85), # Lowest confidence a fuzzy match (similar name and the same IP) needs to count
+            "match_fuzzy": str(os.getenv('MATCH_FUZZY') or "true").lower() == "true", # false to only match exact names, serials and DNS names
+            "match_exclude": os.getenv('MATCH_EXCLUDE', "RRC*"), # Names left out of the "missing from NinjaOne" lists, ie. servers
+            # Per device details from the per device endpoints, see enrich.py
+            "enrich": str(os.getenv('ENRICH') or "false").lower() == "true", # Turn enrichment on for option 6 (commands use --enrich)
+            "enrich_details": [d.strip() for d in (os.getenv('ENRICH_DETAILS') or "disks,software,patches,activity").split(",") if d.strip() != ""],
+            "enrich_workers": int(os.getenv('ENRICH_WORKERS') or 16), # How many per device requests may be waiting at once
+            "enrich_ttl": int(os.getenv('ENRICH_TTL') or 86400), # Seconds fetched details are reused for
+            # Fingerprints of the last run that change reports are worked out from, see changes.py (None keeps one file per set of organizations in Logs)
+            "changes_state_path": os.getenv('CHANGES_STATE_PATH') or None,
+        }
+    return config
+
+
+# Added to the names of files that belong to one tenant (snapshot, job and log files), so tenants never share them
+def tenant_suffix():
+    return "" if tenant is None else "-" + tenant
+
+
+# A file path with the tenant's name added before the extension, ie. snapshot.db is snapshot-acme.db for tenant acme
+# Used for configured paths as well as the defaults, ids are only unique within an instance so tenants can't share a snapshot
+def tenant_path(path):
+    root, ext = os.path.splitext(path)
+    return root + tenant_suffix() + ext
+
+
+# Work out which tenant profiles --tenant refers to, 'all' is every profile in PROFILES_DIR
+def tenant_names(specs):
+    wanted = [spec.strip() for value in specs for spec in value.split(",") if spec.strip() != ""]
+    folder = get_config()["profiles_dir"]
+
+    if "all" in [spec.lower() for spec in wanted]:
+        names = sorted(f[:-4] for f in os.listdir(folder) if f.endswith(".env")) if os.path.isdir(folder) else []
+        if len(names) == 0:
+            raise ValueError("There are no tenant profiles in " + folder)
+        return names
+
+    names = []
+    for name in wanted:
+        if not os.path.isfile(os.path.join(folder, name + ".env")):
+            raise ValueError("Unknown tenant " + name + ", there is no " + os.path.join(folder, name + ".env"))
+        if name not in names:
+            names.append(name)
+    return names
+
+
+# Switch to a tenant profile, its settings (instance, credentials, AD source, XLSX sheet...) override the ones in .env
+def use_tenant(name):
+    global tenant
+    global config
+    global xl_config
+    global client
+    global store
+    from dotenv import load_dotenv
+
+    path = os.path.join(get_config()["profiles_dir"], name + ".env")
+    if not os.path.isfile(path):
+        raise ValueError("Unknown tenant " + name + ", there is no " + path)
+    load_dotenv(path, override=True)
+
+    # Settings are read again with the profile in place, anything it leaves out still comes from .env
+    tenant = name
+    config = None
+    xl_config = None
+    client = None
+    store = None
+
+
+# Show a table of results in the menu, streamed a row at a time and cut down by --limit/--columns
+def show_table(header, rows, style="single"):
+    try:
+        output.print_table(header, rows, style, table_limit, table_columns)
+    except ValueError as Error: # --columns named a column this table doesn't have
+        print("ERROR: ", Error)
+        for row in rows: # Still read every row, whatever builds them may have more to do
+            pass
+
+
+# Get the API client that every NinjaOne call goes through, so the pooled connections are reused for the whole run
+def get_client():
+    global client
+    if client is None:
+        from ninja_api import NinjaClient # Imports requests, so only when the API is actually used
+        settings = get_config()
+        url = settings["instance_url"] # A tenant's own instance, otherwise the default endpoint
+        client = NinjaClient(url.rstrip("/") + "/v2/" if url else endpoint, url.rstrip("/") + "/ws/oauth/token" if url else oauth_url, timeout=settings["http_timeout"], max_retries=settings["api_max_retries"],
+                             pool_size=max(settings["sweep_workers"], settings["host_concurrency"]), host_concurrency=settings["host_concurrency"])
+    return client
+
+
+# Get the local snapshot store, returns None when snapshots are turned off
+def get_store():
+    global store
+    if store is None and get_config()["snapshot_ttl"] > 0:
+        from snapshot import SnapshotStore
+        store = SnapshotStore(config["snapshot_path"])
+    return store
+
+
+# Check if a snapshot is young enough to answer from, --refresh always forces a new download
+def snapshot_fresh(source, scope=""):
+    return get_store() is not None and not refresh and store.fresh(source, scope, config["snapshot_ttl"])
+
+
+# Call api endpoint for bearer token, currently this is just uses a machine-to-machine application using client credentials
+# Tokens are cached on disk between runs and refreshed automatically shortly before they expire or after a 401
+@metrics.timed("token")
+def get_token():
+    global api_token
+    settings = get_config()
+    api_token = get_client().use_credentials(settings["client_id"], settings["client_secret"], "monitoring",
+                                             settings["token_cache_path"], settings["token_refresh_margin"])
+
+
+# Get the list of organizations in NinjaOne
+@metrics.timed("orgs")
+def fetch_orgs(token):
+    if snapshot_fresh("orgs"):
+        return store.orgs()
+
+    organizations = get_client().organizations(token)
+    if get_store() is not None:
+        store.replace_orgs(organizations)
+    return organizations
+
+
+# Get organizations assocaited in NinjaOne
+def get_orgs(token):
+    global orgs
+    global orgs_id
+    global user_sel
+
+    organizations = fetch_orgs(token)
+
+    orgs = []
+    orgs_id = []
+
+    print('-'*80 + "\nOrganizations\n" + '-'*80 + '\n')
+
+    c = 0
+    for org in organizations:
+        c = c + 1
+        print(str(c) + ". " + str(org["name"]))
+        orgs.append(org["name"])
+        orgs_id.append(org["id"])
+
+    print('\n')
+
+    sel =  input("Please select an organization " + "(1-" + str(len(organizations)) + ")... ")
+    user_sel = orgs_id[int(sel)-1] # We want the user_sel to be the organization id that they selected, since the ids may not be in numerical order
+    print("ORGANIZATION ID : ", str(user_sel))
+    get_devices_detailed(token)
+
+
+# Page through devices-detailed using the pageSize/after cursor, one list of devices is yielded per page as it arrives
+def iter_device_pages(token, org_id, page_size=None):
+    return get_client().device_pages(token, org_id, int(page_size or get_config()["device_page_size"]))
+
+
+# Turn a page of device records into Devices, a device that can't be parsed is reported and skipped
+def parse_devices(page, org=None):
+    parsed = []
+    for k in page:
+        try:
+            parsed.append(Device.from_api(k, org))
+        except Exception as Error:
+            print("ERROR: ", Error)
+    return parsed
+
+
+# Bring the snapshot of an organization's devices up to date
+# The lightweight device list tells us which devices changed (lastUpdate) or were removed since the last snapshot,
+# so only the changed devices have to be downloaded again from devices-detailed
+@metrics.timed("snapshot_refresh")
+def refresh_org_devices(token, org_id):
+    versions = store.device_versions(org_id)
+
+    if len(versions) == 0: # Nothing stored for this organization yet, so everything has to be downloaded
+        pages = iter_device_pages(token, org_id)
+    else:
+        changed = []
+        seen = set()
+        for page in get_client().device_summary_pages(token, org_id, get_config()["device_page_size"]):
+            for k in page:
+                seen.add(k["id"])
+                if k["id"] not in versions or versions[k["id"]] != k.get("lastUpdate"):
+                    changed.append(k["id"])
+        store.delete_devices([i for i in versions if i not in seen])
+        pages = get_client().devices_by_id(token, changed, get_config()["device_page_size"])
+
+    for page in pages:
+        rows = []
+        for k in page:
+            try:
+                device = Device.from_api(k)
+                rows.append(device.row() + [k.get("lastUpdate"), k.get("lastContact")] + device.match_row())
+            except Exception as Error:
+                print("ERROR: ", Error)
+        store.upsert_devices(org_id, rows)
+        metrics.count(len(rows))
+    store.mark_devices(org_id)
+
+
+# Yield pages of Devices for an organization, answered from the snapshot when snapshots are turned on
+def iter_org_device_pages(token, org_id):
+    if get_store() is None:
+        for page in iter_device_pages(token, org_id):
+            yield parse_devices(page)
+        return
+
+    if not snapshot_fresh("devices", org_id):
+        refresh_org_devices(token, org_id)
+    for rows in store.device_pages(org_id, get_config()["device_page_size"]):
+        yield [Device.from_row(row) for row in rows]
+
+
+# Start a new, empty table of devices gathered from NinjaOne
+def reset_devices():
+    global ninja_devices
+    global recon
+
+    recon = None # The devices are changing so any previous reconciliation is out of date
+    ninja_devices = DeviceTable()
+
+
+# Get detailed information on devices
+@metrics.timed("devices")
+def get_devices_detailed(token):
+    org_id = str(user_sel) if str(user_sel) != "" else get_config()["domain_org_id"]
+
+    reset_devices()
+
+    print('\n' + '-'*80 + "\nDevices in NinjaOne...\n" + '-'*80)
+
+    # Devices are drawn as they arrive rather than after the whole fleet has downloaded, only one page is held as rows at a time
+    def rows():
+        for page in iter_org_device_pages(token, org_id):
+            for device in page:
+                ninja_devices.add(device)
+            metrics.count(len(page))
+            for device in page:
+                yield device.row()
+
+    show_table(device_header, rows())
+
+    if len(ninja_devices) == 0:
+        print("\nThere are no devices currently associated with this organization...\n")
+        sys.exit()
+
+
+# Fetch every device in a single organization, this runs inside a worker thread during a sweep
+@metrics.timed("org_devices")
+def fetch_org_devices(token, org):
+    found = []
+    for page in iter_device_pages(token, org["id"]):
+        found.extend(parse_devices(page, org["name"]))
+    metrics.count(len(found))
+    return found
+
+
+# Fetch devices for several organizations at once, each organization is fetched in its own worker
+# (organization, devices) is yielded as each one finishes and the devices are added to ninja_devices
+def iter_orgs_devices(token, organizations):
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    with ThreadPoolExecutor(max_workers=max(1, min(get_config()["sweep_workers"], len(organizations)))) as executor:
+        futures = {executor.submit(fetch_org_devices, token, org): org for org in organizations}
+        for future in as_completed(futures):
+            org = futures[future]
+            try:
+                found = future.result()
+            except Exception as Error:
+                print("ERROR: Unable to get devices for " + str(org["name"]) + " - ", Error)
+                continue
+
+            for device in found:
+                ninja_devices.add(device)
+            yield org, found
+
+
+# Get detailed information on devices in all (or a selection of) organizations at once and merge them into one inventory
+def sweep_orgs(token):
+    organizations = fetch_orgs(token)
+
+    print('-'*80 + "\nOrganizations\n" + '-'*80 + '\n')
+    for c, org in enumerate(organizations, start=1):
+        print(str(c) + ". " + str(org["name"]))
+    print('\n')
+
+    sel = input("Please select organizations separated by commas " + "(1-" + str(len(organizations)) + "), or press enter for all... ").strip()
+    if sel != "":
+        organizations = [organizations[int(i)-1] for i in sel.split(",") if i.strip() != ""]
+
+    reset_devices()
+
+    print('\n' + '-'*80 + "\nDevices in NinjaOne across " + str(len(organizations)) + " organizations...\n" + '-'*80)
+
+    # Results are drawn and merged as soon as each organization finishes
+    def rows():
+        for org, found in iter_orgs_devices(token, organizations):
+            for device in found:
+                yield [org["name"]] + device.row()
+
+    show_table(["Organization"] + device_header, rows())
+
+    count = len(ninja_devices)
+    print("\n" + str(count) + " devices found across " + str(len(organizations)) + " organizations...\n")
+
+
+# Spreadsheet settings from .env, resolved once the first time the XLSX sheet is used instead of on every row
+def get_xl_config():
+    global xl_config
+    if xl_config is None:
+        get_config() # Make sure .env has been loaded
+        xl_config = {
+            "path": os.getenv('XL_PATH'),
+            "sheet": str(os.getenv('XL_WORKSHEET_NAME')),
+            "min_row": int(os.getenv('XL_MIN_ROW')),
+            "max_row": int(os.getenv('XL_MAX_ROW')),
+            "columns": {
+                "id": int(os.getenv('XL_ID_COL')),
+                "name": int(os.getenv('XL_SYS_NAME_COL')),
+                "ninja_status": int(os.getenv('XL_NINJA_STATUS_COL')),
+                "domain_status": int(os.getenv('XL_DOMAIN_STATUS_COL')),
+            },
+            "ninja_letter": str(os.getenv('XL_NINJA_STATUS_COL_LETTER')),
+            "domain_letter": str(os.getenv('XL_DOMAIN_STATUS_COL_LETTER')),
+            "writeback": (os.getenv('XL_WRITEBACK') or "workbook").lower(), # workbook, delta or both
+            "delta_path": tenant_path(os.getenv('XL_DELTA_PATH') or os.path.join(os.getcwd() + "\\Logs\\", "status-delta.csv")),
+        }
+    return xl_config
+
+
+# Load excel sheet and gather device info
+# Only the configured worksheet and columns are read, from a read-only workbook
+@metrics.timed("workbook_load")
+def get_excel_data():
+    global path
+    global xl_data
+    global xl_ids
+    global xl_system_names 
+    global xl_row_num
+    global xl_ninja_statuses
+    global xl_domain_statuses
+    global recon
+
+    recon = None
+
+    config = get_xl_config()
+    path = config["path"]
+    import xlsx_io
+    xl_data = xlsx_io.read_sheet_columns(path, config["sheet"], config["columns"], config["min_row"], config["max_row"])
+
+    # Each of these is one column of the sheet
+    xl_ids = xl_data["id"]
+    xl_system_names = xl_data["name"]
+    xl_row_num = xl_data["row"] # The actual row number in the sheet, so blank rows in the range don't shift where statuses are written
+    xl_ninja_statuses = xl_data["ninja_status"]
+    xl_domain_statuses = xl_data["domain_status"]
+    metrics.count(len(xl_system_names))
+
+
+# Compare the devices in the Excel File with NinjaOne & the Domain
+# Returns the rows for displaying, which devices are missing from where, and the status cells that need to change
+@metrics.timed("compare")
+def compare_sheet():
+    ad_missing = []
+    ninja_missing = []
+    changes = [] # Only the status cells whose value actually changed
+    data = [] #Array to store values for displaying in the table
+
+    result = get_reconciliation()
+    config = get_xl_config()
+    domain_letter = config["domain_letter"]
+    ninja_letter = config["ninja_letter"]
+
+    for i in range(len(xl_system_names)):
+        dev_in_domain, dev_in_ninja = result.excel_status[i]
+        if not dev_in_domain:
+            ad_missing.append(xl_system_names[i])
+        if not dev_in_ninja:
+            ninja_missing.append(xl_system_names[i])
+
+        # Compare with what the sheet already says so unchanged cells are never rewritten
+        for letter, column, old, new in ((domain_letter, "domain", xl_domain_statuses[i], 'Y' if dev_in_domain else 'N'),
+                                         (ninja_letter, "ninja", xl_ninja_statuses[i], 'Y' if dev_in_ninja else 'N')):
+            if str(old).strip().upper() != new:
+                changes.append({"index": i, "device": xl_system_names[i], "column": column, "cell": letter + str(xl_row_num[i]), "old": old, "new": new})
+
+        domain_match, ninja_match = result.excel_matches[i]
+        data.append([xl_system_names[i], 'YES' if dev_in_domain else 'NO', 'YES' if dev_in_ninja else 'NO',
+                     "" if domain_match is None else domain_match.describe(), "" if ninja_match is None else ninja_match.describe()])
+
+    # Which devices are missing from NinjaOne & Domain
+    both = result.excel_only
+    metrics.count(len(xl_system_names))
+
+    return data, ninja_missing, ad_missing, both, changes
+
+
+# Compare results of devices in NinjaOne to the Excel File and update values in the "Computers" sheet
+def compare_res():
+    print('\n' + '-'*80 + "\nDevices In The Excel File And Their Statuses In NinjaOne & Domain...\n" + '-'*80)
+
+    data, ninja_missing, ad_missing, both, changes = compare_sheet()
+
+    show_table(compare_header, data, "double")
+
+    #Write to the log file and save changes made to the workbook
+    write_to_file(ninja_missing, ad_missing, both)
+    write_back_statuses(changes)
+
+
+# Save status changes back to the XLSX file in one batch, and/or as a delta file for sheets that are too large to rewrite often
+@metrics.timed("workbook_save")
+def write_back_statuses(changes):
+    config = get_xl_config()
+
+    if len(changes) == 0:
+        print("No statuses have changed, the XLSX file was left untouched...\n")
+        return
+
+    import xlsx_io
+    try:
+        if config["writeback"] in ("delta", "both"):
+            xlsx_io.write_delta(config["delta_path"], changes, ["device", "column", "cell", "old", "new"])
+            print("SUCCESS: " + str(len(changes)) + " status changes have been saved in " + config["delta_path"] + '...\n')
+
+        if config["writeback"] in ("workbook", "both"):
+            xlsx_io.write_cells(path, config["sheet"], changes)
+            print("SUCCESS: " + str(len(changes)) + " status changes have been saved in " + path + '...\n')
+    except Exception as Error:
+        print("ERROR: Unable to save status changes - ", Error)
+        return
+
+    metrics.count(len(changes))
+
+    # The sheet now matches, so a second comparison in the same run only reports new changes
+    for change in changes:
+        statuses = xl_domain_statuses if change["column"] == "domain" else xl_ninja_statuses
+        statuses[change["index"]] = change["new"]
+
+
+# Get an enricher for per device details, details are cached in the snapshot store when there is one
+def get_enricher(token):
+    import enrich
+
+    settings = get_config()
+    ttl = 0 if refresh else settings["enrich_ttl"] # --refresh fetches every detail again
+    return enrich.Enricher(get_client(), token, settings["enrich_details"], settings["enrich_workers"], ttl, get_store())
+
+
+# (device, details) for devices, enriched as they complete when there is an enricher, otherwise in order with no details
+def enriched(devices, enricher=None):
+    if enricher is None:
+        return ((d, None) for d in devices)
+    return enricher.stream(devices)
+
+
+# Let the user know if some details couldn't be fetched, they are left out of the cache so the next run tries them again
+def report_enrichment(enricher):
+    if enricher is not None and enricher.errors > 0:
+        print("ERROR: " + str(enricher.errors) + " device details couldn't be fetched, they are marked with ERROR in the results...")
+
+
+# Rows of every device in NinjaOne with whether it is in NinjaOne/the Domain, built as they are asked for
+# With an enricher the details are added on the end and rows come out as each device's details arrive
+def export_rows(enricher=None):
+    matches = get_reconciliation().ninja_matches
+    for d, details in enriched(ninja_devices, enricher):
+        match = matches.get(ninja_devices.by_id[d.id])
+        yield ([d.name, d.status, d.os, d.brand, d.model, d.serial, d.memory, d.processor, d.last_login, d.last_boot,
+                "Y" if in_ninja(d.name) else "N", "Y" if in_domain(d.name) else "N", "" if match is None else match.describe()] +
+               ([] if details is None else enricher.cells(details)))
+
+
+# Where the generated XLSX file for an organization is saved
+def export_path(org_name):
+    # Concat the selected org name with the file name
+    wb_name = org_name.replace(" ", "-") + "-Ninja-Devices-" + str(datetime.now().strftime("%Y-%m-%d-%H-%M")) + ".xlsx"
+    
+    folder_path = os.getcwd() + "\\XLSX Results\\" 
+
+    if not os.path.exists(folder_path): # Lets check if the folder already exists first
+        os.mkdir(folder_path)
+
+    return folder_path + wb_name
+
+
+# Generate an excel file with all devices in a specified organization and their information
+# Rows are streamed into a write-only workbook so memory stays flat no matter how many devices there are
+@metrics.timed("xlsx_export")
+def generate_xlsx():
+
+    print("Generating XLSX file with results of devices in Ninja...")
+
+    import xlsx_io
+    try: 
+        # Lets make a note of any devices not in Ninja
+        device_in_domain_not_ninja()
+
+        # user_sel is the selected orgs id, run a function to get the org name from its ID
+        full_path = export_path(orgs[orgs_id.index(user_sel)])
+
+        # Per device details are only fetched when ENRICH=true, rows are written as each device's details come in
+        enricher = get_enricher(api_token) if get_config()["enrich"] else None
+        header = export_header + (enricher.header() if enricher is not None else [])
+        metrics.count(xlsx_io.write_streaming_xlsx(full_path, header, export_rows(enricher), "NinjaDevices", "NOTE : Devices NOT in Ninja but in the Domain...",
+                                                   devices_in_domain_not_ninja, get_config()["device_page_size"]))
+        report_enrichment(enricher)
+
+        print("\nSuccessfully generated XLSX file, file can be found at..." + full_path + "\n")
+    except Exception as Error:
+        print("ERROR: Unable to generate XLSX file - ", Error)
+
+
+# Load all computers associated with Active Directory, returns False if they couldn't be listed
+# The computers come from the directory source picked by AD_SOURCE (powershell, ldap or file), or the snapshot while it is fresh
+@metrics.timed("ad_computers")
+def load_ad_computers():
+    global ad_rows
+    global ad_dns
+    global ad_ips
+    global ad_names
+    global recon
+
+    recon = None
+    ad_dns = []
+    ad_ips = []
+    ad_names = []
+
+    if snapshot_fresh("ad"):
+        ad_rows = store.ad_rows()
+    else:
+        try:
+            import directory
+            get_config() # The directory source reads its settings from .env
+            with metrics.span("ad_export") as export:
+                ad_rows = list(directory.source_from_env(csv_name="computers" + tenant_suffix() + ".csv").computers())
+                export.add(len(ad_rows))
+        except FileNotFoundError:
+            print("ERROR: CSV file not found...")
+            return False
+        except Exception as Error:
+            print("ERROR: Unable to list computers in the domain - ", Error)
+            return False
+
+        if get_store() is not None:
+            store.replace_ad(ad_rows)
+
+    # Now let's check/store values for later comparisons
+    for name, dns, ip in ad_rows:
+        ad_names.append(name)
+        ad_dns.append(dns)
+        if ip == '': # Some of the IPs are unknown in the domain for some reason, this is just to check 
+            ad_ips.append('   UNKNOWN  ')
+        else:
+            ad_ips.append(ip)
+    metrics.count(len(ad_rows))
+    return True
+
+
+# Rows of computers in the domain for displaying, with unknown IPs spelled out
+def ad_computer_rows():
+    for name, dns, ip in ad_rows:
+        yield [name, dns, 'UNKNOWN' if ip == '' else ip]
+
+
+# Get all computers associated with Active Directory
+def get_ad_computers():
+    if not load_ad_computers():
+        return
+
+    print('\n' + '-'*80 + "\nDevices in the Domain...\n" + '-'*80)
+    show_table(ad_header, ad_computer_rows(), "double")
+
+
+# Get the enrollment job for an organization, resuming the one in the job file unless restart is set
+# The installer link is only fetched from NinjaOne when the job doesn't already have one
+def get_enrollment_job(token, org_id, path=None, restart=False):
+    import enroll
+
+    settings = get_config()
+    path = path or settings["enroll_job_path"]
+    job = None if restart else enroll.EnrollmentJob.load(path)
+
+    if job is not None and str(job.org_id) != str(org_id):
+        raise ValueError("The job in " + path + " is for organization " + str(job.org_id) + ", use another job file or start it over")
+    if job is None:
+        job = enroll.EnrollmentJob(path, str(org_id))
+
+    if not job.installer_url:
+        with metrics.span("installer_link"):
+            location_id = settings["enroll_location_id"]
+            if not location_id:
+                locations = get_client().locations(token, org_id)
+                if len(locations) == 0:
+                    raise ValueError("Organization " + str(org_id) + " has no locations to enroll devices into")
+                location_id = locations[0]["id"]
+            job.location_id = location_id
+            job.installer_url = get_client().installer_url(token, org_id, location_id, settings["enroll_installer_type"])
+    return job
+
+
+# Install the NinjaOne agent on every pending host in a job, a bounded number of hosts at a time
+@metrics.timed("enroll")
+def enroll_devices(job, template=None, workers=None):
+    import enroll
+
+    settings = get_config()
+    total = len(job.pending())
+    finished = [0]
+
+    def progress(host, state):
+        finished[0] = finished[0] + 1
+        print("[" + str(finished[0]) + "/" + str(total) + "] " + host + " : " + state.upper())
+
+    counts = enroll.run_job(job, template or settings["enroll_command"], workers or settings["enroll_workers"],
+                            settings["enroll_timeout"], progress)
+    metrics.count(counts["done"])
+    return counts
+
+
+# Add devices that are in the domain but NOT NinjaOne to the NinjaOne organization
+# Progress is kept in the job file, so running this again resumes the same job
+def add_to_ninja():
+    device_in_domain_not_ninja()
+
+    org_id = str(user_sel) if str(user_sel) != "" else get_config()["domain_org_id"]
+    try:
+        job = get_enrollment_job(api_token, org_id)
+    except Exception as Error:
+        print("ERROR: Unable to start the enrollment job - ", Error)
+        return
+
+    added = job.add_hosts(devices_in_domain_not_ninja)
+    skipped = job.skip_hosts_not_in(devices_in_domain_not_ninja)
+    counts = job.counts()
+    print("\nEnrollment job " + job.path + " : " + str(added) + " new devices, " + str(skipped) + " now in NinjaOne, " + ", ".join(str(n) + " " + state for state, n in counts.items()) + "...")
+
+    if counts["failed"] > 0 and input("Retry the " + str(counts["failed"]) + " devices that failed last time? (y/n)... ").strip().lower() == "y":
+        job.retry_failed()
+
+    pending = len(job.pending())
+    if pending == 0:
+        print("\nThere are no devices waiting to be enrolled...\n")
+        job.save()
+        return
+    if input("Install the NinjaOne agent on " + str(pending) + " devices? (y/n)... ").strip().lower() != "y":
+        job.save()
+        print("\nNothing was installed, the job has been saved in " + job.path + "...\n")
+        return
+
+    counts = enroll_devices(job)
+    show_table(enroll_header, job.rows(), "double")
+    print("\n" + str(counts["done"]) + " devices enrolled, " + str(counts["failed"]) + " failed, the job has been saved in " + job.path + "...\n")
+
+
+# Where the fingerprints of the last run are kept for a set of organizations, ie. Logs\inventory-1.json
+def changes_state_path(scope):
+    configured = get_config()["changes_state_path"]
+    if configured:
+        return tenant_path(configured)
+    return os.path.join(os.getcwd() + "\\Logs\\", "inventory" + tenant_suffix() + "-" + scope.replace(",", "-") + ".json")
+
+
+# Work out what changed in NinjaOne and the Domain since the last run, for the organizations in scope (ie. "1,7")
+# Returns rows of changes_header, and saves this run as the one the next run is compared with unless save is False
+@metrics.timed("changes")
+def inventory_changes(scope, path=None, save=True):
+    import changes
+
+    path = path or changes_state_path(scope)
+    previous = changes.InventoryState.load(path)
+    if previous is not None and previous.scope != scope:
+        raise ValueError("The fingerprints in " + path + " are for organizations " + previous.scope + ", use another state file")
+
+    current = changes.InventoryState.capture(path, scope, ninja_devices, globals().get('ad_rows', []), in_ninja)
+    metrics.count(len(current.ninja) + len(current.ad))
+    rows = [] if previous is None else changes.diff(previous, current)
+
+    if previous is None:
+        print("\nThere is no earlier run to compare with, this run will be compared with next time...")
+    else:
+        counts = changes.summary(rows)
+        print("\nChanges since " + datetime.fromtimestamp(previous.taken).strftime('%m-%d-%Y %H:%M:%S') + " : " +
+              (", ".join(str(n) + " " + change for change, n in counts.items()) or "nothing has changed") + "...")
+    if save:
+        current.save()
+    return rows
+
+
+# Show what changed since the last run and save the changes as a CSV report in the log folder
+def show_changes():
+    org_id = str(user_sel) if str(user_sel) != "" else str(get_config()["domain_org_id"])
+    try:
+        rows = inventory_changes(org_id)
+    except Exception as Error:
+        print("ERROR: Unable to work out what changed - ", Error)
+        return
+
+    print('\n' + '-'*80 + "\nChanges In NinjaOne & The Domain...\n" + '-'*80)
+    show_table(changes_header, rows, "double")
+
+    if len(rows) > 0:
+        report_path = os.path.join(os.getcwd() + "\\Logs\\", "changes" + tenant_suffix() + "-" + datetime.now().strftime("%Y-%m-%d-%H-%M") + ".csv")
+        try:
+            output.write_rows(changes_header, rows, "csv", report_path)
+            print("\nSUCCESS: Changes have been saved in " + report_path + "...\n")
+        except OSError as Error:
+            print("ERROR: Unable to save the changes report - ", Error)
+
+
+#Comparison functions
+# Build the reconciliation of NinjaOne, the Domain and the XLSX sheet once and share it between every option
+# Names are matched case insensitively without FQDN suffixes (a 15 character NetBIOS name also matches the longer name it was cut from), serials and DNS names are matched too,
+# then whatever is left is matched on similar names with a confidence score, counting only when the IP is the same too
+def get_reconciliation():
+    global recon
+    if recon is None:
+        settings = get_config()
+        with metrics.span("reconcile") as s:
+            ninja = ninja_devices.index()
+            domain = reconcile.DeviceIndex(globals().get('ad_names', []), dns=globals().get('ad_dns', []), ips=globals().get('ad_ips', []))
+            excel = reconcile.DeviceIndex(xl_system_names) if 'xl_system_names' in globals() else None
+            recon = reconcile.Reconciliation(ninja, domain, excel, settings["match_threshold"], settings["match_fuzzy"])
+            s.add(len(ninja) + len(domain) + (len(excel) if excel is not None else 0))
+    return recon
+
+
+def in_ninja(device):
+    return get_reconciliation().in_ninja(device)
+
+
+def in_domain(device):
+    return get_reconciliation().in_domain(device)
+
+
+# Write results to results.txt file in the specified log path
+def write_to_file(ninja_missing, ad_missing, both):
+
+    dev_lbl = "Device: "
+    folder_path = os.getcwd() + "\\Logs\\"
+    file_path = os.path.join(folder_path, "results" + tenant_suffix() + ".txt")
+
+    if not os.path.exists(folder_path): # Lets check if our file already exists...
+        os.mkdir(folder_path)
+    else:
+        pass
+
+    try:    
+        with open(file_path, "w") as f:
+            f.write("NinjaOne\n" + "------------\n")
+            for i in range(len(ninja_missing)):
+                f.write(dev_lbl + ninja_missing[i] + " has NOT yet joined NinjaOne... \n")
+            f.write("\nDomain\n" + "--------\n")
+            for d in range(len(ad_missing)):
+                f.write(dev_lbl + ad_missing[d] + " has NOT yet joined the Domain... \n")
+            f.write("\nNinjaOne & Domain\n" + "----------------\n")
+            for k in range(len(both)):
+                f.write(dev_lbl + both[k] + " has NOT yet joined the Domain or NinjaOne... \n")
+            f.write("\nSUCCESS: Script completed at - " + str(datetime.now()))
+
+            print('-'*80 + "\n\nSUCCESS: Results have been saved in " + file_path + '...\n')   
+
+    except FileNotFoundError:
+        print("\nERROR: File not found. Unable to create log file and/or log folder, please check permissions on your CWD...\n")  
+
+
+# The closest device on the other side of a device that wasn't matched and how close it was, blank when nothing came close
+def closest_columns(result, side, match):
+    if match is None:
+        return ["", ""]
+    return [result.name_of(side, match), match.describe()]
+
+
+def device_in_ninja_not_domain():
+    data = []
+    header = ["System Name", "Closest Match", "Confidence"]
+
+    result = get_reconciliation()
+    for name, match in result.unmatched("ninja"):
+        data.append([name] + closest_columns(result, "ninja", match))
+
+    print("\nDevices in NinjaOne but NOT the domain...\n")
+    show_table(header, data, "double")
+
+
+# Rows of devices in the domain but not NinjaOne with their closest match, leaving out anything matching MATCH_EXCLUDE (ie. servers)
+def domain_not_ninja_rows():
+    result = get_reconciliation()
+    exclusions = reconcile.Exclusions.parse(get_config()["match_exclude"])
+    return [[str(name)] + closest_columns(result, "domain", match) for name, match in result.unmatched("domain") if not exclusions.excluded(name)]
+
+
+# Names of devices in the domain but not NinjaOne
+def domain_not_ninja_names():
+    return [row[0] for row in domain_not_ninja_rows()]
+
+
+def device_in_domain_not_ninja():
+    global devices_in_domain_not_ninja
+    data = domain_not_ninja_rows()
+    devices_in_domain_not_ninja = [row[0] for row in data]
+    header = ["System Name", "Closest Match", "Confidence"]
+
+    print("\nDevices in the domain but NOT NinjaOne...\n")
+    show_table(header, data, "double")
+
+
+# Work out which organizations --org refers to, by id or name. No --org means the default DOMAIN_ORG_ID organization
+def resolve_orgs(token, specs):
+    wanted = [spec.strip() for value in (specs or []) for spec in value.split(",") if spec.strip() != ""]
+    organizations = fetch_orgs(token)
+
+    if len(wanted) == 0:
+        wanted = [str(get_config()["domain_org_id"])]
+    if "all" in [spec.lower() for spec in wanted]:
+        return organizations
+
+    selected = []
+    for spec in wanted:
+        match = [org for org in organizations if str(org["id"]) == spec or str(org["name"]).lower() == spec.lower()]
+        if len(match) == 0:
+            raise ValueError("Unknown organization " + spec)
+        selected.extend(match)
+    return selected
+
+
+# Load devices from every selected organization, a single organization is answered from the snapshot when it is fresh
+@metrics.timed("devices")
+def load_devices(token, organizations):
+    reset_devices()
+    if len(organizations) == 1:
+        org = organizations[0]
+        for page in iter_org_device_pages(token, org["id"]):
+            for device in page:
+                device.org = org["name"]
+                ninja_devices.add(device)
+    else:
+        for org, found in iter_orgs_devices(token, organizations):
+            pass
+    metrics.count(len(ninja_devices))
+
+
+# Rows of devices only in NinjaOne or only in the domain with their closest match
+# With an enricher the NinjaOne devices get their details as they complete, the domain only computers get blank cells
+def diff_rows(result, only=None, enricher=None):
+    if only in (None, "ninja"):
+        ninja_only = (d for i, d in enumerate(ninja_devices) if i not in result.ninja_matches)
+        for d, details in enriched(ninja_only, enricher):
+            match = result.ninja_near.get(ninja_devices.by_id[d.id])
+            yield [d.name, "NinjaOne"] + closest_columns(result, "ninja", match) + ([] if details is None else enricher.cells(details))
+    if only in (None, "domain"):
+        blank = [] if enricher is None else [""] * len(enricher.header())
+        for row in domain_not_ninja_rows():
+            yield row[:1] + ["Domain"] + row[1:] + blank
+
+
+# Gather the results of one of the commands, returns (status, header, rows, enricher) with rows streamed as they are read
+# header is None when there are no results to write. Progress and errors go to stderr
+def command_results(args):
+    status = 0
+    # Enrolling a given list of hosts doesn't need to know what is in NinjaOne or the domain
+    inventory = args.command != "enroll" or not args.hosts
+
+    enricher = None
+
+    with contextlib.redirect_stdout(sys.stderr):
+        if args.command != "ad":
+            get_token()
+            organizations = resolve_orgs(api_token, args.org)
+            if inventory:
+                load_devices(api_token, organizations)
+        if args.command != "devices" and inventory and not load_ad_computers():
+            return 1, None, None, None
+
+        if getattr(args, "enrich", False):
+            enricher = get_enricher(api_token)
+
+        if args.command == "devices":
+            header = ["Organization"] + device_header + (enricher.header() if enricher is not None else [])
+            rows = ([d.org] + d.row() + ([] if details is None else enricher.cells(details)) for d, details in enriched(ninja_devices, enricher))
+        elif args.command == "ad":
+            header = ad_header
+            rows = ad_computer_rows()
+        elif args.command == "diff":
+            header = ["System Name", "Only In", "Closest Match", "Confidence"] + (enricher.header() if enricher is not None else [])
+            rows = diff_rows(get_reconciliation(), args.only, enricher)
+        elif args.command == "reconcile":
+            get_excel_data()
+            rows, ninja_missing, ad_missing, both, changes = compare_sheet()
+            header = compare_header
+            if not args.no_write_back:
+                write_to_file(ninja_missing, ad_missing, both)
+                write_back_statuses(changes)
+        elif args.command == "export":
+            header = export_header + (enricher.header() if enricher is not None else [])
+            rows = export_rows(enricher)
+        elif args.command == "enroll":
+            if len(organizations) != 1:
+                raise ValueError("Devices can only be enrolled into one organization at a time, pick one with --org")
+            job = get_enrollment_job(api_token, organizations[0]["id"], args.job, args.restart)
+            if args.hosts:
+                job.add_hosts([host.strip() for value in args.hosts for host in value.split(",")])
+            else:
+                missing = domain_not_ninja_names()
+                job.add_hosts(missing)
+                job.skip_hosts_not_in(missing) # Hosts enrolled some other way since the last run
+            if args.retry_failed:
+                job.retry_failed()
+            counts = enroll_devices(job, args.command_template, args.workers)
+            header = enroll_header
+            rows = job.rows()
+            status = 1 if counts["failed"] > 0 else 0
+        elif args.command == "changes":
+            header = changes_header
+            rows = inventory_changes(",".join(sorted(str(org["id"]) for org in organizations)), args.state, not args.no_save)
+
+    return status, header, rows, enricher
+
+
+# Run one of the commands without the menu
+# Anything other than the results (progress, errors, log messages) goes to stderr so stdout can be piped
+def run_command(args):
+    status, header, rows, enricher = command_results(args)
+    if header is None:
+        return status
+
+    output_path = args.output
+    if args.command == "export" and args.format == "xlsx" and output_path is None:
+        output_path = export_path("-".join(sorted(set(str(d.org) for d in ninja_devices))) or "Devices")
+
+    with metrics.span("output") as s:
+        s.add(output.write_rows(header, rows, args.format, output_path, table_name="NinjaDevices" if args.command == "export" else "Results",
+                                page_size=get_config()["device_page_size"], limit=table_limit, columns=table_columns))
+    with contextlib.redirect_stdout(sys.stderr):
+        report_enrichment(enricher)
+    return status
+
+
+# Run a command for one tenant, this runs in its own worker process so tenants never share settings, clients or snapshots
+# Rows are written to folder/rows.jsonl and everything the command prints to folder/log.txt
+# Returns (status, header, rows written, error, metrics of the run)
+def run_tenant(name, args, folder):
+    global refresh
+    refresh = args.refresh
+
+    header, count, error = None, 0, None
+    with open(os.path.join(folder, "log.txt"), "w") as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            use_tenant(name)
+            with metrics.span(args.command):
+                status, header, rows, enricher = command_results(args)
+                if header is not None:
+                    count = output.write_rows(header, rows, "jsonl", os.path.join(folder, "rows.jsonl"))
+                    report_enrichment(enricher)
+        except Exception as Error:
+            status, header, error = 1, None, str(Error)
+    return status, header, count, error, metrics.snapshot()
+
+
+# Rows written by each tenant's worker, in tenant order with the tenant's name in front
+def tenant_rows(folder, names, results, header):
+    import json
+    for name in names:
+        if results[name][1] is None:
+            continue
+        with open(os.path.join(folder, name, "rows.jsonl"), "r", encoding="utf-8") as f:
+            for line in f:
+                values = json.loads(line)
+                yield [name] + [values.get(column, "") for column in header]
+
+
+# Run a command for several tenants at once, TENANT_WORKERS tenants at a time each in its own process
+# Their results are merged into one report with a Tenant column, a tenant that fails is reported and left out of it
+def run_tenants(args, names):
+    import shutil
+    import tempfile
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    folder = tempfile.mkdtemp(prefix="ninjatoolkit-")
+    results = {}
+    try:
+        workers = max(1, min(get_config()["tenant_workers"], len(names)))
+        # Spawned rather than forked so every worker starts clean, without the threads or connections of this process
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = {}
+            for name in names:
+                os.mkdir(os.path.join(folder, name))
+                futures[executor.submit(run_tenant, name, args, os.path.join(folder, name))] = name
+
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    results[name] = future.result()
+                except Exception as Error: # The worker itself died
+                    results[name] = (1, None, 0, str(Error), None)
+                status, header, count, error, data = results[name]
+
+                # Show what the tenant printed once it is done, so tenants running side by side don't interleave
+                log_path = os.path.join(folder, name, "log.txt")
+                if os.path.exists(log_path):
+                    with open(log_path, "r") as log:
+                        for line in log:
+                            if line.strip() != "":
+                                print("[" + name + "] " + line.rstrip(), file=sys.stderr)
+                if error is not None:
+                    print("ERROR: Tenant " + name + " - " + error, file=sys.stderr)
+                elif header is not None:
+                    print("Tenant " + name + " finished with " + str(count) + " rows...", file=sys.stderr)
+                if data is not None:
+                    metrics.merge(data, "tenant " + name)
+
+        headers = [results[name][1] for name in names if results[name][1] is not None]
+        if len(headers) > 0:
+            output_path = args.output
+            if args.command == "export" and args.format == "xlsx" and output_path is None:
+                output_path = export_path("Tenants")
+            with metrics.span("output") as s:
+                s.add(output.write_rows(["Tenant"] + headers[0], tenant_rows(folder, names, results, headers[0]), args.format, output_path,
+                                        table_name="NinjaDevices" if args.command == "export" else "Results",
+                                        page_size=get_config()["device_page_size"], limit=table_limit, columns=table_columns))
+
+        failed = [name for name in names if results[name][0] != 0]
+        if len(failed) > 0:
+            print("\n" + str(len(failed)) + " of " + str(len(names)) + " tenants failed : " + ", ".join(failed), file=sys.stderr)
+        return max(results[name][0] for name in names)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+# Main
+def main():
+    get_token()
+    print("\nStarting NinjaOneToolKit v.1.1...")   
+    print('-'*80 + "\n 1: List all devices in Ninja\n", "2: List all devices in the domain\n", "3: List all devices that are in Ninja but NOT the domain\n", 
+          "4: List all devices that are in the domain but NOT Ninja\n", "5: List devices in Ninja & the domain and compare with XLSX file\n", 
+          "6: Generate XLSX file of devices in Ninja\n", "7: Add computers in the domain but NOT Ninja to NinjaOne\n", "8: List all devices across every organization in Ninja\n",
+          "9: List what changed in Ninja & the domain since the last run\n")
+
+    choice = int(input("Please select an option from the list above (1-9)... "))
+
+    with metrics.span("option " + str(choice)):
+        run_option(choice)
+
+
+# Run one of the menu options
+def run_option(choice):
+    if choice == 1: # List all devices in NinjaOne
+        get_orgs(api_token)
+    elif choice == 2: # List all devices in the Domain
+        get_ad_computers()
+    elif choice == 3: # List all devices that are in Ninja but NOT the domain
+        get_ad_computers()
+        get_devices_detailed(api_token)
+        device_in_ninja_not_domain()
+    elif choice == 4: # List all devices that are in the domain but NOT Ninja
+        get_ad_computers()
+        get_devices_detailed(api_token)
+        device_in_domain_not_ninja()    
+    elif choice == 5: # Get devices in NinjaOne and the Domain and compare with the XLSX Sheet
+        get_ad_computers()
+        get_devices_detailed(api_token)  
+        get_excel_data()
+        compare_res()
+    elif choice == 6: # Generate XLSX file from results of devicves in Ninja
+        get_orgs(api_token)
+        get_ad_computers()
+        generate_xlsx()
+    elif choice == 7: # Add computers that are in the domain but NOT NinjaOne to NinjaOne
+        get_ad_computers()
+        get_devices_detailed(api_token)
+        add_to_ninja()
+    elif choice == 8: # List all devices across every organization in NinjaOne
+        sweep_orgs(api_token)
+    elif choice == 9: # List what changed in NinjaOne and the Domain since the last run
+        get_ad_computers()
+        get_devices_detailed(api_token)
+        show_changes()
+    else:
+        print("\nERROR: Please re-run the script and enter a valid value, 1-9")
+
+
+# Parse the command line and run either a command or the interactive menu
+def run(argv=None):
+    global refresh
+    global table_limit
+    global table_columns
+
+    args = build_parser().parse_args(argv)
+    refresh = args.refresh
+    table_limit = args.limit
+    table_columns = [c for c in args.columns.split(",") if c.strip() != ""] if args.columns else None
+
+    # This is specifically to ignore the random warning that is generated when accessing the worksheet via openpyxl (does not affect the script)
+    warnings.simplefilter('ignore')
+
+    try:
+        names = []
+        if args.tenant:
+            try:
+                names = tenant_names(args.tenant)
+                if len(names) > 1 and args.command in (None, "enroll"):
+                    raise ValueError("Several tenants can only be run with a command other than enroll, pick one tenant for the menu or enrolling")
+            except Exception as Error:
+                print("ERROR: ", Error, file=sys.stderr)
+                return 1
+            if len(names) == 1:
+                use_tenant(names[0])
+
+        if args.command is None:
+            main()
+            return 0
+
+        try:
+            if len(names) > 1:
+                with metrics.span("tenants") as s:
+                    s.add(len(names))
+                    return run_tenants(args, names)
+            with metrics.span(args.command):
+                return run_command(args)
+        except BrokenPipeError: # The reader went away, ie. piped into head
+            sys.stderr.close()
+            return 0
+        except Exception as Error:
+            print("ERROR: ", Error, file=sys.stderr)
+            return 1
+    finally:
+        report_metrics(args)
+
+
+# Show the --profile summary and/or write the metrics file at the end of a run
+def report_metrics(args):
+    if args.profile and not sys.stderr.closed:
+        metrics.print_profile()
+    if args.metrics:
+        try:
+            metrics.write(args.metrics)
+        except OSError as Error:
+            print("ERROR: Unable to write metrics to " + args.metrics + " - ", Error, file=sys.stderr)
+
+
+if __name__=="__main__":
+    sys.exit(run())
\ No newline at end of file
@@ -0,0 +1,249 @@
+# NinjaOneToolKit - Metrics
+# Lightweight timing and counters for a run, so a slow run shows where its time went
+# - span()/timed() : times a phase (token, device download, AD export, workbook load, reconciliation, workbook save...)
+#                    and count() adds to the records it handled, spans opened inside another span are named parent/child
+# - record_http()  : latency, bytes, retries and status codes per API endpoint, called by ninja_api for every request
+# - peak_rss_mb()  : the most memory the process has used so far
+# - merge()        : adds the metrics of another process (ie. a tenant's worker) to this run's
+# Everything is kept in memory until the end of the run, then shown with --profile and/or written with --metrics PATH
+
+import os
+import sys
+import json
+import time
+import tempfile
+import functools
+import threading
+from contextlib import contextmanager
+
+
+lock = threading.Lock()
+local = threading.local() # The stack of open spans on each thread
+spans = {} # name: {"count", "total_s", "max_s", "records"}, in the order they were first opened
+http = {} # "METHOD /path": {"requests", "errors", "retries", "total_s", "max_s", "bytes", "statuses": {code: count}}
+started = time.time()
+
+
+def reset():
+    global started
+    with lock:
+        spans.clear()
+        http.clear()
+        started = time.time()
+
+
+class Span:
+    def __init__(self, name):
+        self.name = name
+        self.records = 0
+
+    # Count records handled in this span, for the records/sec column
+    def add(self, records):
+        self.records = self.records + records
+
+
+# Time a phase of the run, ie. with metrics.span("devices") as s: ... s.add(len(page))
+@contextmanager
+def span(name):
+    stack = getattr(local, "stack", None)
+    if stack is None:
+        stack = local.stack = []
+
+    current = Span("/".join([s.name for s in stack[-1:]] + [name]))
+    stack.append(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        elapsed = time.perf_counter() - start
+        stack.pop()
+        with lock:
+            entry = spans.setdefault(current.name, {"count": 0, "total_s": 0.0, "max_s": 0.0, "records": 0})
+            entry["count"] = entry["count"] + 1
+            entry["total_s"] = entry["total_s"] + elapsed
+            entry["max_s"] = max(entry["max_s"], elapsed)
+            entry["records"] = entry["records"] + current.records
+
+
+# Decorator that runs a whole function inside a span, ie. @metrics.timed("workbook_load")
+def timed(name):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Count records handled by the innermost span open on this thread, does nothing outside of a span
+def count(records):
+    stack = getattr(local, "stack", None)
+    if stack:
+        stack[-1].add(records)
+
+
+# Record one API request, status is None when no response came back at all
+def record_http(method, path, status, elapsed, size=0, retries=0):
+    key = method + " " + path
+    with lock:
+        entry = http.setdefault(key, {"requests": 0, "errors": 0, "retries": 0, "total_s": 0.0, "max_s": 0.0, "bytes": 0, "statuses": {}})
+        entry["requests"] = entry["requests"] + 1
+        entry["retries"] = entry["retries"] + retries
+        entry["total_s"] = entry["total_s"] + elapsed
+        entry["max_s"] = max(entry["max_s"], elapsed)
+        entry["bytes"] = entry["bytes"] + size
+        code = "none" if status is None else str(status)
+        entry["statuses"][code] = entry["statuses"].get(code, 0) + 1
+        if status is None or status >= 400:
+            entry["errors"] = entry["errors"] + 1
+
+
+# Peak resident memory of the process in MB, None if it can't be found on this platform
+def peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 ** 2) if sys.platform == "darwin" else peak / 1024 # Bytes on macOS, KB everywhere else
+    except ImportError: # Windows
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / (1024 ** 2)
+    except (ImportError, AttributeError):
+        return None
+
+
+# Current resident memory of the process in MB, through psutil when it is installed and /proc on Linux otherwise
+def rss_mb():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 ** 2)
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 ** 2)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+# Everything recorded so far as one dict
+def snapshot():
+    with lock:
+        return {
+            "started": started,
+            "wall_s": time.time() - started,
+            "peak_rss_mb": peak_rss_mb(),
+            "spans": {name: dict(entry) for name, entry in spans.items()},
+            "http": {key: dict(entry, statuses=dict(entry["statuses"])) for key, entry in http.items()},
+        }
+
+
+# Add a snapshot() taken in another process, its phases are put under prefix (ie. "tenant acme") and API requests are added to ours
+def merge(data, prefix=None):
+    with lock:
+        for name, e in data["spans"].items():
+            entry = spans.setdefault(prefix + "/" + name if prefix else name, {"count": 0, "total_s": 0.0, "max_s": 0.0, "records": 0})
+            entry["count"] = entry["count"] + e["count"]
+            entry["total_s"] = entry["total_s"] + e["total_s"]
+            entry["max_s"] = max(entry["max_s"], e["max_s"])
+            entry["records"] = entry["records"] + e["records"]
+        for key, e in data["http"].items():
+            entry = http.setdefault(key, {"requests": 0, "errors": 0, "retries": 0, "total_s": 0.0, "max_s": 0.0, "bytes": 0, "statuses": {}})
+            for field in ("requests", "errors", "retries", "total_s", "bytes"):
+                entry[field] = entry[field] + e[field]
+            entry["max_s"] = max(entry["max_s"], e["max_s"])
+            for code, count in e["statuses"].items():
+                entry["statuses"][code] = entry["statuses"].get(code, 0) + count
+
+
+def rate(records, seconds):
+    return records / seconds if records > 0 and seconds > 0 else None
+
+
+# Summary tables for --profile, returns (header, rows) for the spans and for the API endpoints
+def span_table():
+    rows = []
+    for name, e in snapshot()["spans"].items():
+        per_sec = rate(e["records"], e["total_s"])
+        rows.append([name, e["count"], round(e["total_s"], 3), round(e["max_s"], 3), e["records"] or "", "" if per_sec is None else round(per_sec)])
+    return ["Phase", "Count", "Total (s)", "Max (s)", "Records", "Records/sec"], rows
+
+
+def http_table():
+    rows = []
+    for key, e in snapshot()["http"].items():
+        statuses = ", ".join(code + "x" + str(count) for code, count in sorted(e["statuses"].items()))
+        rows.append([key, e["requests"], e["retries"], e["errors"], round(e["total_s"] / e["requests"] * 1000, 1),
+                     round(e["max_s"] * 1000, 1), round(e["bytes"] / 1024, 1), statuses])
+    return ["Endpoint", "Requests", "Retries", "Errors", "Avg (ms)", "Max (ms)", "KB", "Statuses"], rows
+
+
+# Print the summary tables, to stderr so they never end up mixed into piped results
+def print_profile(file=None):
+    from tabulate import tabulate
+
+    file = file or sys.stderr
+    data = snapshot()
+    print('\n' + '-'*80 + "\nProfile...\n" + '-'*80, file=file)
+    header, rows = span_table()
+    print(tabulate(rows, headers=header, tablefmt='simple_grid'), file=file)
+    header, rows = http_table()
+    if len(rows) > 0:
+        print(tabulate(rows, headers=header, tablefmt='simple_grid'), file=file)
+    peak = data["peak_rss_mb"]
+    print("\nWall time : %.3f s, peak memory : %s MB\n" % (data["wall_s"], "?" if peak is None else "%.1f" % peak), file=file)
+
+
+# Metrics in the Prometheus text format, for the node exporter textfile collector
+def prometheus():
+    data = snapshot()
+    lines = []
+
+    def metric(name, kind, help, samples):
+        lines.append("# HELP ninjatoolkit_" + name + " " + help)
+        lines.append("# TYPE ninjatoolkit_" + name + " " + kind)
+        for labels, value in samples:
+            label_text = ",".join(key + '="' + str(val).replace("\\", "\\\\").replace('"', '\\"') + '"' for key, val in labels.items())
+            lines.append("ninjatoolkit_" + name + ("{" + label_text + "}" if label_text else "") + " " + repr(float(value)))
+
+    metric("run_started_timestamp_seconds", "gauge", "When the run started", [({}, data["started"])])
+    metric("run_duration_seconds", "gauge", "Wall time of the run", [({}, data["wall_s"])])
+    if data["peak_rss_mb"] is not None:
+        metric("peak_rss_bytes", "gauge", "Peak resident memory of the run", [({}, data["peak_rss_mb"] * 1024 ** 2)])
+
+    metric("phase_seconds_total", "counter", "Time spent in each phase", [({"phase": n}, e["total_s"]) for n, e in data["spans"].items()])
+    metric("phase_max_seconds", "gauge", "Longest single run of each phase", [({"phase": n}, e["max_s"]) for n, e in data["spans"].items()])
+    metric("phase_runs_total", "counter", "How many times each phase ran", [({"phase": n}, e["count"]) for n, e in data["spans"].items()])
+    metric("phase_records_total", "counter", "Records handled by each phase", [({"phase": n}, e["records"]) for n, e in data["spans"].items()])
+
+    endpoints = [(key.split(" ", 1), e) for key, e in data["http"].items()]
+    metric("http_requests_total", "counter", "API requests by endpoint and status",
+           [({"method": m, "endpoint": p, "status": code}, count) for (m, p), e in endpoints for code, count in sorted(e["statuses"].items())])
+    metric("http_retries_total", "counter", "API requests retried by endpoint", [({"method": m, "endpoint": p}, e["retries"]) for (m, p), e in endpoints])
+    metric("http_request_seconds_total", "counter", "Time spent waiting on each endpoint", [({"method": m, "endpoint": p}, e["total_s"]) for (m, p), e in endpoints])
+    metric("http_request_max_seconds", "gauge", "Slowest request to each endpoint", [({"method": m, "endpoint": p}, e["max_s"]) for (m, p), e in endpoints])
+    metric("http_response_bytes_total", "counter", "Bytes received from each endpoint", [({"method": m, "endpoint": p}, e["bytes"]) for (m, p), e in endpoints])
+
+    return "\n".join(lines) + "\n"
+
+
+# Write the metrics as JSON (.json) or a Prometheus textfile (anything else, ie. .prom), chosen by the file extension
+# The file is written next to its destination and swapped into place so a collector never reads half a file
+def write(path):
+    folder = os.path.dirname(os.path.abspath(path))
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+
+    text = json.dumps(snapshot(), indent=2) if path.lower().endswith(".json") else prometheus()
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".metrics-")
+    try:
+        os.chmod(tmp_path, 0o644) # Collectors usually run as another user
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
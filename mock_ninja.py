@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+
+# NinjaOneToolKit - Mock NinjaOne API
+# A local stand-in for the parts of the NinjaOne API the toolkit uses, for benchmarking and testing away from a real instance
+# - POST /ws/oauth/token         : hands out a bearer token for any client credentials
+# - GET  /v2/organizations/      : a fixed list of organizations
+# - GET  /v2/devices-detailed/   : synthetic devices, paged with pageSize/after and filtered with df=org=ID or df=id in (...)
+# - GET  /v2/devices/            : the same devices without the hardware details
+# - GET  /v2/organization/ID/locations                    : one location per organization
+# - GET  /v2/organization/ID/location/ID/installer/TYPE   : a made up installer download link
+# - GET  /v2/device/ID/disks, software, os-patches, activities : per device details, built from the device id
+# - GET  /_stats                 : how many requests were made (per path) and how many were throttled, ?reset=1 starts the counts again
+# Devices are built from their id on request so even very large organizations take no memory up front
+#
+# Usage : python3 mock_ninja.py --devices 10000 [--port 8080] [--throttle-every 50]
+
+import sys
+import json
+import time
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class MockNinja:
+    def __init__(self, devices=1000, orgs=2, throttle_every=0, retry_after=0, latency=0.0):
+        self.devices = devices # Devices in the first organization, every other organization gets 1% of that
+        self.orgs = [{"id": i, "name": "Mock Organization " + str(i)} for i in range(1, orgs + 1)]
+        self.throttle_every = throttle_every # Answer every Nth API request with 429 Too Many Requests, 0 to never throttle
+        self.retry_after = retry_after
+        self.latency = latency # Seconds added to every response
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.count = 0
+            self.throttled = 0
+            self.paths = {}
+
+    def stats(self):
+        with self.lock:
+            return {"requests": self.count, "throttled": self.throttled, "paths": dict(self.paths)}
+
+    # Count a request, returns True if it should be throttled
+    def hit(self, path):
+        with self.lock:
+            self.count = self.count + 1
+            self.paths[path] = self.paths.get(path, 0) + 1
+            if self.throttle_every > 0 and self.count % self.throttle_every == 0:
+                self.throttled = self.throttled + 1
+                return True
+            return False
+
+    # Device ids of an organization, the first organization holds ids 1..devices and the others follow on after it
+    def org_ids(self, org_id):
+        if org_id == 1:
+            return range(1, self.devices + 1)
+        size = max(1, self.devices // 100)
+        start = self.devices + (org_id - 2) * size + 1
+        return range(start, start + size) if 2 <= org_id <= len(self.orgs) else range(0)
+
+    def org_of(self, device_id):
+        if device_id <= self.devices:
+            return 1
+        return 2 + (device_id - self.devices - 1) // max(1, self.devices // 100)
+
+    def device(self, device_id, detailed=True):
+        k = {"id": device_id, "organizationId": self.org_of(device_id), "systemName": device_name(device_id),
+             "offline": device_id % 9 == 0, "lastUpdate": 1700000000 + device_id, "lastContact": 1700000000 + device_id,
+             "dnsName": device_name(device_id).lower() + ".mock.local", "ipAddresses": [device_ip(device_id)]}
+        if detailed:
+            k["lastLoggedInUser"] = "MOCK\\user" + str(device_id % 500)
+            k["os"] = {"name": ["Windows 10 Pro", "Windows 11 Pro", "Windows Server 2019"][device_id % 3], "lastBootTime": 1700000000 + device_id % 86400}
+            k["system"] = {"manufacturer": ["Dell Inc.", "LENOVO", "HP"][device_id % 3], "model": "Model " + str(device_id % 20),
+                           "serialNumber": "SN" + str(device_id).zfill(8)}
+            k["memory"] = {"capacity": (8 + 8 * (device_id % 4)) * 1024 ** 3}
+            k["processors"] = [{"name": ["Intel(R) Core(TM) i5", "Intel(R) Core(TM) i7", "AMD Ryzen 7"][device_id % 3]}]
+        return k
+
+    # Per device details, the same device always gets the same details
+    def detail(self, device_id, kind):
+        if kind == "disks":
+            return [{"mediaType": ["SSD", "HDD"][device_id % 2], "model": "Mock Disk", "size": (256 + 256 * (device_id % 4)) * 1000 ** 3}]
+        if kind == "software":
+            return [{"name": "Mock App " + str(i), "version": "1.0"} for i in range(20 + device_id % 30)]
+        if kind == "os-patches":
+            return [{"name": "KB" + str(5000000 + i), "status": ["PENDING", "INSTALLED", "FAILED"][(device_id + i) % 3]} for i in range(device_id % 5)]
+        return {"activities": [{"id": device_id, "activityTime": 1700000000 + device_id % 86400, "activityType": "ACTION"}]}
+
+    # The devices matching a df device filter, in id order
+    def select(self, device_filter):
+        if device_filter.startswith("org="):
+            return self.org_ids(int(device_filter[4:]))
+        if device_filter.startswith("id in (") and device_filter.endswith(")"):
+            return sorted(int(i) for i in device_filter[7:-1].split(",") if i.strip() != "")
+        return range(0)
+
+    def page(self, device_filter, page_size, after, detailed):
+        ids = self.select(device_filter)
+        if isinstance(ids, range): # Jump straight to the cursor instead of walking every earlier id
+            ids = range(max(ids.start, after + 1), ids.stop)
+        else:
+            ids = [i for i in ids if i > after]
+        return [self.device(device_id, detailed) for device_id in ids[:page_size]]
+
+
+# Device names follow the same pattern in the mock API and the synthetic AD/XLSX data so they can be matched up
+def device_name(device_id):
+    return "WS-" + str(device_id).zfill(6)
+
+
+def device_ip(device_id):
+    return "10.%d.%d.%d" % (device_id // 65536 % 256, device_id // 256 % 256, device_id % 256)
+
+
+class Handler(BaseHTTPRequestHandler):
+    mock = None
+    protocol_version = "HTTP/1.1" # Keep-alive, like the real API
+    disable_nagle_algorithm = True # Headers and body are written separately, without this every response waits on a delayed ACK
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def throttle(self, path):
+        if self.mock.latency > 0:
+            time.sleep(self.mock.latency)
+        if self.mock.hit(path):
+            self.send_json(429, {"error": "Too Many Requests"}, {"Retry-After": str(self.mock.retry_after)})
+            return True
+        return False
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        url = urlparse(self.path)
+
+        if url.path != "/ws/oauth/token":
+            return self.send_json(404, {"error": "Not Found"})
+        if self.throttle(url.path):
+            return
+        self.send_json(200, {"access_token": "mock-token-" + str(int(time.time())), "token_type": "Bearer", "expires_in": 3600})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+
+        if url.path == "/_stats":
+            stats = self.mock.stats()
+            if "reset" in query:
+                self.mock.reset()
+            return self.send_json(200, stats)
+
+        parts = url.path.strip("/").split("/")
+        known = url.path in ("/v2/organizations/", "/v2/devices-detailed/", "/v2/devices/")
+        locations = len(parts) == 4 and parts[:2] == ["v2", "organization"] and parts[3] == "locations"
+        installer = len(parts) == 7 and parts[:2] == ["v2", "organization"] and parts[3] == "location" and parts[5] == "installer"
+        detail = len(parts) == 4 and parts[:2] == ["v2", "device"] and parts[3] in ("disks", "software", "os-patches", "activities")
+        if not (known or locations or installer or detail):
+            return self.send_json(404, {"error": "Not Found"})
+        if not str(self.headers.get("Authorization", "")).startswith("Bearer "):
+            return self.send_json(401, {"error": "Unauthorized"})
+        if self.throttle(url.path):
+            return
+
+        if url.path == "/v2/organizations/":
+            return self.send_json(200, self.mock.orgs)
+        if locations:
+            return self.send_json(200, [{"id": int(parts[2]) * 10, "name": "Main Office"}])
+        if detail:
+            return self.send_json(200, self.mock.detail(int(parts[2]), parts[3]))
+        if installer:
+            return self.send_json(200, {"url": "https://mock.ninjarmm.local/agent/installer/" + "-".join(parts[2:7:2]) + "/NinjaOneAgent.msi"})
+
+        page_size = int(query.get("pageSize", ["1000"])[0])
+        after = int(query.get("after", ["0"])[0])
+        self.send_json(200, self.mock.page(query.get("df", [""])[0], page_size, after, url.path == "/v2/devices-detailed/"))
+
+
+# Start the mock API on a background thread, port 0 picks any free port. Returns the server, its address is server.server_address
+def start(mock, host="127.0.0.1", port=0):
+    handler = type("MockHandler", (Handler,), {"mock": mock})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the NinjaOne API")
+    parser.add_argument('--devices', type=int, default=1000, help="Devices in the first organization (default: 1000)")
+    parser.add_argument('--orgs', type=int, default=2, help="How many organizations there are (default: 2)")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=0, help="Port to listen on, 0 for any free port (default: 0)")
+    parser.add_argument('--throttle-every', type=int, default=0, help="Answer every Nth request with 429 (default: never)")
+    parser.add_argument('--retry-after', type=int, default=0, help="Retry-After seconds sent with a 429 (default: 0)")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every response (default: 0)")
+    args = parser.parse_args()
+
+    server = start(MockNinja(args.devices, args.orgs, args.throttle_every, args.retry_after, args.latency), args.host, args.port)
+    # The first line of output is the base url, so whoever started us can find the port that was picked
+    print("http://%s:%d" % server.server_address, flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__=="__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+# NinjaOneToolKit - NinjaOne API client
+# A single pooled, keep-alive requests session that every call to the NinjaOne API goes through
+# so connection setup is only paid once per run, and slow or failing responses are timed out and retried
+
+import os
+import re
+import json
+import time
+import tempfile
+import threading
+import requests
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import metrics
+
+
+id_pattern = re.compile(r"/\d+(?=/|$)")
+
+# Keeps OAuth tokens on disk (readable only by the current user) keyed by client id, scope and instance,
+# so repeated runs reuse a valid token and tokens are refreshed shortly before they expire
+class TokenCache:
+    def __init__(self, client, client_id, client_secret, scope="monitoring", path=None, refresh_margin=60):
+        self.client = client
+        self.client_id = str(client_id)
+        self.client_secret = str(client_secret)
+        self.scope = scope
+        self.path = path or os.path.join(os.path.expanduser("~"), ".ninjaonetoolkit", "token_cache.json")
+        self.refresh_margin = refresh_margin
+        self.key = self.client_id + ":" + scope + "@" + urlparse(client.oauth_url).netloc # Tenants can share one cache file
+        self.entry = None # {"access_token": ..., "expires_at": epoch seconds}
+        self.issued = set() # Every token we have handed out, so stale copies can be swapped for the current one
+        self.lock = threading.Lock()
+
+    def valid(self, entry):
+        return entry is not None and entry.get("expires_at", 0) - self.refresh_margin > time.time()
+
+    # Read every cached token, a missing or unreadable cache file just means we have nothing cached
+    def read(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    # Write the cache through a temp file that is only readable by us, then swap it into place
+    def write(self, cache):
+        folder = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.exists(folder):
+            os.makedirs(folder, mode=0o700)
+
+        fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".token-")
+        try:
+            os.chmod(tmp_path, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump(cache, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    # Get a valid access token, from memory, then the cache file, and only then from the oauth endpoint
+    def token(self, force=False):
+        with self.lock:
+            if not force and not self.valid(self.entry):
+                cached = self.read().get(self.key)
+                if self.valid(cached):
+                    self.entry = cached
+
+            if force or not self.valid(self.entry):
+                response = self.client.get_token(self.client_id, self.client_secret, self.scope)
+                self.entry = {
+                    "access_token": response["access_token"],
+                    "expires_at": time.time() + int(response.get("expires_in", 3600)),
+                }
+                cache = self.read()
+                cache[self.key] = self.entry
+                try:
+                    self.write(cache)
+                except OSError as Error:
+                    print("ERROR: Unable to save the token cache, the token will only be used for this run - ", Error)
+
+            self.issued.add(self.entry["access_token"])
+            return self.entry["access_token"]
+
+    # Swap a token we issued earlier for the current one, refreshing it first if it is about to expire
+    def fresh(self, token):
+        if token in self.issued:
+            return self.token()
+        return token
+
+
+class NinjaClient:
+    def __init__(self, endpoint, oauth_url, timeout=(5, 30), max_retries=5, backoff=0.5, pool_size=10, host_concurrency=4):
+        self.endpoint = endpoint
+        self.oauth_url = oauth_url
+        self.timeout = timeout # (connect, read) in seconds
+
+        # Retry connection errors, 5xx and 429 with exponential backoff, honouring Retry-After when the API sends it
+        retry = Retry(total=max_retries, backoff_factor=backoff, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=None, respect_retry_after_header=True, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive",
+        })
+
+        # One semaphore per API host so worker threads never exceed the per host concurrency limit
+        self.host_concurrency = host_concurrency
+        self.host_limits = {}
+        self.host_limits_lock = threading.Lock()
+
+        self.tokens = None # TokenCache, set by use_credentials() so tokens refresh on their own
+
+    # Let the client manage its own tokens using client credentials, returns the current access token
+    def use_credentials(self, client_id, client_secret, scope="monitoring", cache_path=None, refresh_margin=60):
+        self.tokens = TokenCache(self, client_id, client_secret, scope, cache_path, refresh_margin)
+        return self.tokens.token()
+
+    # Get the semaphore that limits how many requests can be in flight to the host of a url
+    def host_semaphore(self, url):
+        host = urlparse(url).netloc
+        with self.host_limits_lock:
+            if host not in self.host_limits:
+                self.host_limits[host] = threading.BoundedSemaphore(self.host_concurrency)
+            return self.host_limits[host]
+
+    # Send a request through the shared session, raises requests.HTTPError if it still fails after retrying
+    def request(self, method, url, token=None, **kwargs):
+        headers = kwargs.pop("headers", {})
+        if token is not None and self.tokens is not None:
+            token = self.tokens.fresh(token)
+        if token is not None:
+            headers["Authorization"] = "Bearer " + token
+
+        response = self.send(method, url, headers, **kwargs)
+
+        # The token was revoked or expired early, get a new one and try once more
+        if response.status_code == 401 and token is not None and self.tokens is not None and token in self.tokens.issued:
+            headers["Authorization"] = "Bearer " + self.tokens.token(force=True)
+            response = self.send(method, url, headers, **kwargs)
+
+        response.raise_for_status()
+        return response
+
+    # Send a single request within the host's concurrency limit and record its latency, size, retries and status per endpoint
+    def send(self, method, url, headers, **kwargs):
+        path = id_pattern.sub("/{id}", urlparse(url).path) # device/123/disks and device/456/disks are the same endpoint
+        with self.host_semaphore(url):
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, headers=headers, timeout=self.timeout, **kwargs)
+            except requests.RequestException:
+                metrics.record_http(method, path, None, time.perf_counter() - start)
+                raise
+            elapsed = time.perf_counter() - start
+
+        retry = getattr(response.raw, "retries", None) # urllib3 keeps the history of every retry it made
+        metrics.record_http(method, path, response.status_code, elapsed, len(response.content),
+                            len(retry.history) if retry is not None else 0)
+        return response
+
+    # GET an endpoint relative to the v2 API and return the decoded JSON
+    def get(self, path, token, params=None):
+        return self.request("GET", self.endpoint + path, token, params=params).json()
+
+    # Call the oauth endpoint for a bearer token using client credentials, returns the whole token response
+    def get_token(self, client_id, client_secret, scope="monitoring"):
+        data = {
+            "grant_type": "client_credentials",
+            "client_id": str(client_id),
+            "client_secret": str(client_secret),
+            "scope": scope
+        }
+
+        headers = {"Content-Type": "application/x-www-form-urlencoded"}
+
+        return self.request("POST", self.oauth_url, data=data, headers=headers).json()
+
+    # Get the list of organizations in NinjaOne
+    def organizations(self, token):
+        return self.get("organizations/", token)
+
+    # Get the locations of an organization
+    def locations(self, token, org_id):
+        return self.get("organization/" + str(org_id) + "/locations", token)
+
+    # Get a download link for the agent installer of an organization's location, installer_type is ie. WINDOWS_MSI
+    def installer_url(self, token, org_id, location_id, installer_type="WINDOWS_MSI"):
+        return self.get("organization/" + str(org_id) + "/location/" + str(location_id) + "/installer/" + installer_type, token)["url"]
+
+    # Page through a device listing using the pageSize/after cursor, one list of devices is yielded per page as it arrives
+    def pages(self, path, token, device_filter, page_size=1000):
+        after = None
+
+        while True:
+            params = {"df": device_filter, "pageSize": page_size}
+            if after is not None:
+                params["after"] = after
+
+            page = self.get(path, token, params)
+
+            # Only an empty page ends the list, the API may cap pageSize below what was asked for so a short page isn't the end
+            if len(page) == 0:
+                break
+
+            yield page
+            after = page[-1]["id"] # The cursor is the id of the last device we received
+
+    # Page through devices-detailed, using the built in device filter param to only get devices in a specific org
+    def device_pages(self, token, org_id, page_size=1000):
+        return self.pages("devices-detailed/", token, "org=" + str(org_id), page_size)
+
+    # Page through the lightweight device list of an org, this carries lastUpdate/lastContact but none of the hardware details
+    def device_summary_pages(self, token, org_id, page_size=1000):
+        return self.pages("devices/", token, "org=" + str(org_id), page_size)
+
+    # Get detailed information for specific devices only, requested in batches of page_size ids
+    def devices_by_id(self, token, ids, page_size=1000):
+        ids = list(ids)
+        for i in range(0, len(ids), page_size):
+            batch = ids[i:i + page_size]
+            for page in self.pages("devices-detailed/", token, "id in (" + ",".join(str(d) for d in batch) + ")", page_size):
+                yield page
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,171 @@
+# NinjaOneToolKit - Output
+# Write rows of results as a table, CSV, JSON Lines or XLSX, to a file or straight to stdout
+# Rows are written as they come so large results stream instead of being built up in memory first
+# - Tables are drawn a row at a time, column widths are worked out from the first rows (or the header) instead of the whole table,
+#   cells that don't fit are cut short so every row stays on one line of the terminal
+# - limit and columns cut a result down to the first rows and the columns that matter
+# - Anything that isn't going to a terminal is written as tab separated rows, which is much faster to write and easy to pipe
+
+import sys
+import csv
+import json
+import shutil
+from itertools import islice, chain
+
+
+formats = ["table", "csv", "jsonl", "xlsx"]
+
+sample_size = 200 # Rows column widths are worked out from
+max_column_width = 40 # Widest a column is drawn before its cells are cut short
+min_column_width = 6 # Narrowest a column is squeezed to when the table is wider than the terminal
+
+# Box drawing characters for each table style: (horizontal, vertical, corners and joints from top left to bottom right)
+styles = {
+    "single": ("─", "│", "┌┬┐", "├┼┤", "└┴┘"),
+    "double": ("═", "║", "╔╦╗", "╠╬╣", "╚╩╝"),
+}
+
+
+# Keep only some columns, picked by header name (case insensitive) or number (1 is the first column)
+# Returns the new header and the rows, the rows are cut down as they are read
+def select_columns(header, rows, columns):
+    if not columns:
+        return header, rows
+
+    lower = [str(h).lower() for h in header]
+    picks = []
+    for column in columns:
+        column = str(column).strip()
+        if column.isdigit() and 1 <= int(column) <= len(header):
+            picks.append(int(column) - 1)
+        elif column.lower() in lower:
+            picks.append(lower.index(column.lower()))
+        else:
+            raise ValueError("Unknown column " + column + ", the columns are " + ", ".join(str(h) for h in header))
+    return [header[i] for i in picks], ([row[i] if i < len(row) else "" for i in picks] for row in rows)
+
+
+# Cut rows down to the first limit, None or 0 keeps every row
+# Returns the rows to show and a function that tells whether any were left over once they have been shown
+def limit_rows(rows, limit):
+    rows = iter(rows)
+    if not limit:
+        return rows, lambda: False
+    return islice(rows, limit), lambda: next(rows, None) is not None
+
+
+# A cell as text that fits in width characters, numbers are lined up on the right
+def fit(value, width):
+    text = "" if value is None else str(value).replace("\n", " ").replace("\t", " ")
+    if len(text) > width:
+        return text[:width - 1] + "…"
+    return text.rjust(width) if isinstance(value, (int, float)) and not isinstance(value, bool) else text.ljust(width)
+
+
+# Column widths from the header and a sample of rows, squeezed to fit in the terminal when there is one
+def column_widths(header, sample, terminal_width=None):
+    widths = [min(max_column_width, max([len(str(h))] + [len(str(row[i])) if i < len(row) and row[i] is not None else 0 for row in sample]))
+              for i, h in enumerate(header)]
+
+    if terminal_width:
+        # Every column also takes a border and a space either side
+        while sum(widths) + 3 * len(widths) + 1 > terminal_width:
+            widest = max(range(len(widths)), key=lambda i: widths[i])
+            if widths[widest] <= min_column_width:
+                break
+            widths[widest] = widths[widest] - 1
+    return widths
+
+
+# Draw a table a row at a time, the header is drawn again every page_size rows so it is never far away
+# Returns how many rows were drawn
+def draw_table(f, header, rows, style="single", page_size=1000, terminal_width=None):
+    horizontal, vertical, top, middle, bottom = styles[style]
+    rows = iter(rows)
+    sample = list(islice(rows, sample_size))
+    widths = column_widths(header, sample, terminal_width)
+
+    def border(corners):
+        return corners[0] + corners[1].join(horizontal * (w + 2) for w in widths) + corners[2] + "\n"
+
+    def line(values):
+        return vertical + vertical.join(" " + fit(v, w) + " " for v, w in zip(values, widths)) + vertical + "\n"
+
+    f.write(border(top) + line(header) + border(middle))
+    count = 0
+    for row in chain(sample, rows):
+        if count > 0 and count % page_size == 0:
+            f.write(border(middle) + line(header) + border(middle))
+        f.write(line(list(row) + [""] * (len(widths) - len(row))))
+        count = count + 1
+    f.write(border(bottom))
+    return count
+
+
+# Show rows as a table on a terminal, or as tab separated rows anywhere else (ie. redirected to a file)
+# Used by the interactive menu, every row is read even past the limit so whatever builds the rows still runs to the end
+def print_table(header, rows, style="single", limit=None, columns=None, file=None):
+    f = file or sys.stdout
+    header, rows = select_columns(header, rows, columns)
+    rows = iter(rows)
+    shown = islice(rows, limit) if limit else rows
+
+    if f.isatty():
+        count = draw_table(f, header, shown, style, terminal_width=shutil.get_terminal_size().columns)
+    else:
+        writer = csv.writer(f, delimiter="\t", lineterminator="\n")
+        writer.writerow(header)
+        count = 0
+        for row in shown:
+            writer.writerow(row)
+            count = count + 1
+
+    if limit:
+        hidden = sum(1 for row in rows)
+        if hidden > 0:
+            print("... " + str(hidden) + " more rows not shown (showing the first " + str(limit) + ")", file=f)
+    f.flush()
+    return count
+
+
+# Write rows in the given format, returns how many rows were written
+# A table is only drawn when it is going to a terminal, otherwise it falls back to tab separated rows
+# limit and columns cut the results down, rows past the limit are never read so nothing is spent building them
+def write_rows(header, rows, fmt="table", path=None, table_name="Results", page_size=1000, limit=None, columns=None):
+    header, rows = select_columns(header, rows, columns)
+    rows, more = limit_rows(rows, limit)
+
+    count = write_formatted(header, rows, fmt, path, table_name, page_size)
+    if limit and count == limit and more():
+        print("Only the first " + str(limit) + " rows were written (--limit)", file=sys.stderr)
+    return count
+
+
+def write_formatted(header, rows, fmt, path, table_name, page_size):
+    if fmt == "xlsx":
+        import xlsx_io # openpyxl is only loaded when an XLSX file is actually written
+        if path is None:
+            raise ValueError("An output path is needed to write an XLSX file, use -o/--output")
+        return xlsx_io.write_streaming_xlsx(path, header, rows, table_name, sample_size=page_size)
+
+    f = open(path, "w", newline="", encoding="utf-8") if path else sys.stdout
+    count = 0
+    try:
+        if fmt == "table" and path is None and sys.stdout.isatty():
+            count = draw_table(f, header, rows, page_size=page_size, terminal_width=shutil.get_terminal_size().columns)
+        elif fmt == "jsonl":
+            for row in rows:
+                f.write(json.dumps(dict(zip(header, row)), default=str) + "\n")
+                count = count + 1
+        else:
+            writer = csv.writer(f, delimiter="\t" if fmt == "table" else ",", lineterminator="\n")
+            writer.writerow(header)
+            for row in rows:
+                writer.writerow(row)
+                count = count + 1
+    finally:
+        if path:
+            f.close()
+        else:
+            f.flush()
+    return count
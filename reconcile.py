@@ -0,0 +1,393 @@
+# NinjaOneToolKit - Reconciliation
+# Build normalized indexes of devices in NinjaOne, the Domain and the XLSX sheet once
+# and work out which devices are in both, only one, or neither
+# - Exact matches on name, serial or DNS name are hash lookups, a single linear pass over each side
+# - Whatever is left over is matched fuzzily: candidates only come from n-gram blocks of the name (and the same IP),
+#   so each device is only scored against a handful of similar names instead of the whole fleet
+# - A similar name alone is only reported as the closest match, it takes a second signal (the same IP) for a fuzzy match to count
+# - Every match carries a confidence (1.0 for exact keys) and the best rejected candidate is kept for review
+
+import os
+import re
+import heapq
+import fnmatch
+from difflib import SequenceMatcher
+
+
+# Serial numbers that manufacturers leave behind on generic boards, these can't be used to match devices
+junk_serials = {"", "N/A", "NONE", "0", "DEFAULT STRING", "TO BE FILLED BY O.E.M.", "SYSTEM SERIAL NUMBER", "NOT SPECIFIED", "NOT APPLICABLE"}
+
+# NetBIOS computer names are limited to 15 characters, AD truncates anything longer
+netbios_length = 15
+netbios_confidence = 0.9 # A 15 character name that is the start of a longer one is probably the same machine, but not certainly
+
+# Fuzzy matching
+default_threshold = 0.85 # Lowest confidence that counts as a match, for fuzzy matches backed by a second signal
+report_only = ("fuzzy name", "ip") # Matches on a single weak signal, shown as the closest match but never counted
+near_floor = 0.5 # Lowest confidence still worth showing as the closest candidate
+gram_size = 3
+max_bucket = 100 # n-grams shared by more names than this (ie. a common WS- prefix) are too common to block on
+max_candidates = 10 # Best blocked candidates scored for each device
+prefix_weight = 0.25 # How much the characters two names start with count towards their similarity
+
+
+# Normalize a device name so case and FQDN suffixes don't stop two names from matching
+# The whole name is kept, cutting every name to NetBIOS length would make ACCOUNTING-LAPTOP-01 and -02 the same key
+def name_key(name):
+    if name is None:
+        return None
+    name = str(name).strip().upper().split(".")[0] # Drop the domain suffix from FQDNs
+    if name == "" or name == "N/A":
+        return None
+    return name
+
+
+# Normalize a serial number, returns None for blank or placeholder serials
+def serial_key(serial):
+    if serial is None:
+        return None
+    serial = str(serial).strip().upper()
+    if serial in junk_serials:
+        return None
+    return serial
+
+
+# Normalize a DNS host name, short names are left to name_key
+def dns_key(dns):
+    if dns is None:
+        return None
+    dns = str(dns).strip().lower().rstrip(".")
+    if "." not in dns:
+        return None
+    return dns
+
+
+# Normalize an IPv4 address, returns None for blank, loopback and link-local addresses that say nothing about the device
+def ip_key(ip):
+    if ip is None:
+        return None
+    ip = str(ip).strip()
+    if ip == "" or ip.upper() == "UNKNOWN" or ip.startswith(("127.", "169.254.", "0.")):
+        return None
+    return ip
+
+
+# The n-grams of a name key, padded so the start and end of the name count as well
+def grams(key):
+    key = "^" + key + "$"
+    return {key[i:i + gram_size] for i in range(len(key) - gram_size + 1)}
+
+
+# The numbers in a name key, ie. (7,) for ACCT-LAPTOP-07
+def numbers(key):
+    return tuple(int(n) for n in re.findall(r"\d+", key))
+
+
+# How alike two name keys are, 0 to 1
+# Names that only differ by their numbers (WS-0101 and WS-0102, ACCT-LAPTOP and ACCT-LAPTOP2) are different machines in the same
+# series, not a rename, so names with different numbers never match. This is checked first since it rules out most candidates cheaply
+# A shared prefix (DESKTOP-, CONF-ROOM-, a site code) says little about two names being the same machine, so it only counts for a quarter
+def name_similarity(a, b):
+    if a is None or b is None:
+        return 0.0
+    if numbers(a) != numbers(b):
+        return 0.0
+    if a == b:
+        return 1.0
+    prefix = len(os.path.commonprefix([a, b]))
+    a, b = a[prefix:], b[prefix:]
+    size = len(a) + len(b)
+    shared = 2 * prefix_weight * prefix
+
+    def blend(ratio): # The ratio of the rest of the names with the prefix added back at its weight
+        return (ratio * size + shared) / (size + shared)
+
+    matcher = SequenceMatcher(None, a, b, autojunk=False)
+    if blend(matcher.real_quick_ratio()) < near_floor or blend(matcher.quick_ratio()) < near_floor:
+        return 0.0
+    return blend(matcher.ratio())
+
+
+# How a device was matched and how sure we are of it
+class Match:
+    __slots__ = ("index", "confidence", "method")
+
+    def __init__(self, index, confidence, method):
+        self.index = index # Position of the matched device in the other index
+        self.confidence = confidence
+        self.method = method # name, serial, dns, netbios name, fuzzy name, fuzzy name + ip or ip
+
+    # ie. 0.92 fuzzy name
+    def describe(self):
+        return "%.2f %s" % (self.confidence, self.method)
+
+    # Whether the match is strong enough to say the two devices are the same one
+    def counts(self, threshold=default_threshold):
+        return self.confidence >= threshold and self.method not in report_only
+
+
+# Score how likely two records (from DeviceIndex.record) are the same device that didn't match on any exact key
+# A shared IP on its own isn't enough since DHCP hands addresses around, and neither is a similar name, but together they are
+def score(a, b):
+    similarity = name_similarity(name_key(a[0]), name_key(b[0]))
+    same_ip = ip_key(a[3]) is not None and ip_key(a[3]) == ip_key(b[3])
+    if same_ip:
+        if similarity >= near_floor:
+            return Match(None, min(0.99, similarity + 0.1), "fuzzy name + ip")
+        return Match(None, near_floor, "ip")
+    return Match(None, min(0.99, similarity), "fuzzy name")
+
+
+# Names to leave out of the "missing" reports, as case insensitive glob patterns (ie. RRC* for servers)
+class Exclusions:
+    def __init__(self, patterns=()):
+        self.patterns = [p.strip() for p in patterns if p.strip() != ""]
+        self.regex = re.compile("|".join(fnmatch.translate(p.upper()) for p in self.patterns)) if self.patterns else None
+
+    # Patterns separated by commas, ie. from MATCH_EXCLUDE in .env
+    @classmethod
+    def parse(cls, text):
+        return cls(str(text or "").split(","))
+
+    def excluded(self, name):
+        return self.regex is not None and self.regex.match(str(name).strip().upper()) is not None
+
+
+# Hash indexes from normalized name, serial and DNS name to the positions of the devices they belong to
+class DeviceIndex:
+    def __init__(self, names, serials=None, dns=None, ips=None):
+        self.names = list(names)
+        self.serials = list(serials or [])
+        self.dns = list(dns or [])
+        self.ips = list(ips or [])
+        self.keys = [name_key(name) for name in self.names]
+        self.by_name = {}
+        self.by_netbios = {} # First 15 characters of names longer than that: position, or None when several names share them
+        self.by_serial = {}
+        self.by_dns = {}
+        self.by_ip = {}
+        self.gram_blocks = None # n-gram: positions, built the first time a fuzzy search needs it
+        self.number_blocks = None # numbers in the name: positions, built with gram_blocks
+
+        for i, key in enumerate(self.keys):
+            if key is not None and key not in self.by_name:
+                self.by_name[key] = i
+                if len(key) > netbios_length:
+                    short = key[:netbios_length]
+                    self.by_netbios[short] = i if self.by_netbios.get(short, i) == i else None
+        for i, serial in enumerate(self.serials):
+            key = serial_key(serial)
+            if key is not None:
+                self.by_serial.setdefault(key, i)
+        for i, dns in enumerate(self.dns):
+            key = dns_key(dns)
+            if key is not None:
+                self.by_dns.setdefault(key, i)
+        for i, ip in enumerate(self.ips):
+            key = ip_key(ip)
+            if key is not None:
+                self.by_ip.setdefault(key, []).append(i)
+
+    def __len__(self):
+        return len(self.names)
+
+    # The raw name, serial, DNS name and IP of the device at a position, used to search another index with it
+    def record(self, i):
+        serial = self.serials[i] if i < len(self.serials) else None
+        dns = self.dns[i] if i < len(self.dns) else None
+        ip = self.ips[i] if i < len(self.ips) else None
+        return self.names[i], serial, dns, ip
+
+    # Find a device by name, serial or DNS name, whichever matches first. Returns a Match or None if nothing matches
+    def lookup(self, name=None, serial=None, dns=None, ip=None):
+        for method, normalize, index, value in (("name", name_key, self.by_name, name), ("serial", serial_key, self.by_serial, serial),
+                                                ("dns", dns_key, self.by_dns, dns)):
+            key = normalize(value)
+            if key is not None and key in index:
+                return Match(index[key], 1.0, method)
+        # A DNS name's host part is often the computer name
+        key = name_key(dns)
+        if key is not None and key in self.by_name:
+            return Match(self.by_name[key], 1.0, "dns")
+        return self.netbios_lookup(name_key(name))
+
+    # Match a name AD cut to NetBIOS length against the longer name it was cut from, or the other way around
+    # Only a name of exactly 15 characters can have been cut, and only when a single longer name starts with it
+    def netbios_lookup(self, key):
+        if key is None or len(key) < netbios_length:
+            return None
+        if len(key) == netbios_length:
+            i = self.by_netbios.get(key)
+        else:
+            i = self.by_name.get(key[:netbios_length])
+        return None if i is None else Match(i, netbios_confidence, "netbios name")
+
+    # Find the position of a device by name, serial or DNS name. Returns None if nothing matches
+    def find(self, name=None, serial=None, dns=None, ip=None):
+        match = self.lookup(name, serial, dns, ip)
+        return None if match is None else match.index
+
+    # Positions worth scoring against a record: names with the same numbers or sharing the most n-grams with it,
+    # and devices on the same IP. allowed limits the search to some positions, ie. the devices that haven't been matched yet
+    def candidates(self, record, allowed=None):
+        if self.gram_blocks is None:
+            self.gram_blocks = {}
+            self.number_blocks = {}
+            for i, key in enumerate(self.keys):
+                if key is not None:
+                    for gram in grams(key):
+                        self.gram_blocks.setdefault(gram, []).append(i)
+                    self.number_blocks.setdefault(numbers(key), []).append(i)
+
+        shared = {}
+        found = []
+        key = name_key(record[0])
+        if key is not None:
+            key_grams = grams(key)
+            for gram in key_grams:
+                block = self.gram_blocks.get(gram)
+                if block is None or len(block) > max_bucket:
+                    continue
+                for i in block:
+                    if allowed is None or i in allowed:
+                        shared[i] = shared.get(i, 0) + 1
+            # Names sharing under a third of the n-grams can't score anywhere near a match, unless they have the same numbers
+            least = max(1, len(key_grams) // 3)
+            block = self.number_blocks.get(numbers(key)) if numbers(key) else None
+            if block is not None and len(block) <= max_bucket:
+                for i in block:
+                    if allowed is None or i in allowed:
+                        shared[i] = shared.get(i, 0) + least
+            found = heapq.nlargest(max_candidates, [i for i in shared if shared[i] >= least], key=shared.get)
+
+        for i in self.by_ip.get(ip_key(record[3]), [])[:max_candidates]:
+            if (allowed is None or i in allowed) and i not in shared:
+                found.append(i)
+        return found
+
+    # The best fuzzy candidate for a record, or None if nothing scores at least near_floor
+    def closest(self, record, allowed=None):
+        best = None
+        for i in self.candidates(record, allowed):
+            match = score(record, self.record(i))
+            if match.confidence >= near_floor and (best is None or match.confidence > best.confidence):
+                match.index = i
+                best = match
+        return best
+
+    def __contains__(self, name):
+        return self.find(name) is not None
+
+
+# Match two indexes against each other
+# Exact keys first, then the devices left over on both sides are paired by fuzzy score, best pairs first, each device at most once
+# Returns ({a position: Match into b}, {b position: Match into a}, {a position: closest rejected Match}, {b position: closest rejected Match})
+def match_indexes(a, b, threshold=default_threshold, fuzzy=True):
+    a_matches = {}
+    b_matches = {}
+    for i in range(len(a)):
+        match = b.lookup(*a.record(i))
+        if match is not None and match.counts(threshold):
+            a_matches[i] = match
+            b_matches.setdefault(match.index, Match(i, match.confidence, match.method))
+    for j in range(len(b)):
+        if j not in b_matches:
+            match = a.lookup(*b.record(j))
+            if match is not None and match.counts(threshold):
+                b_matches[j] = match
+                a_matches.setdefault(match.index, Match(j, match.confidence, match.method))
+
+    a_near = {}
+    b_near = {}
+    if not fuzzy:
+        return a_matches, b_matches, a_near, b_near
+
+    a_left = [i for i in range(len(a)) if i not in a_matches]
+    b_left = set(j for j in range(len(b)) if j not in b_matches)
+    if len(a_left) == 0 or len(b_left) == 0:
+        return a_matches, b_matches, a_near, b_near
+
+    # Block only on what is left of b so common n-grams are measured against the unmatched devices, not the whole fleet
+    left = DeviceIndex([b.names[j] for j in sorted(b_left)], ips=[b.record(j)[3] for j in sorted(b_left)])
+    positions = sorted(b_left)
+
+    pairs = []
+    for i in a_left:
+        record = a.record(i)
+        for k in left.candidates(record):
+            match = score(record, b.record(positions[k]))
+            if match.confidence >= near_floor:
+                pairs.append((match.confidence, i, positions[k], match.method))
+
+    pairs.sort(key=lambda pair: pair[0], reverse=True)
+    for confidence, i, j, method in pairs:
+        if method not in report_only and confidence >= threshold and i not in a_matches and j not in b_matches:
+            a_matches[i] = Match(j, confidence, method)
+            b_matches[j] = Match(i, confidence, method)
+        else:
+            if i not in a_near:
+                a_near[i] = Match(j, confidence, method)
+            if j not in b_near:
+                b_near[j] = Match(i, confidence, method)
+
+    # Near misses are only interesting for devices that ended up unmatched
+    a_near = {i: m for i, m in a_near.items() if i not in a_matches}
+    b_near = {j: m for j, m in b_near.items() if j not in b_matches}
+    return a_matches, b_matches, a_near, b_near
+
+# Matches are kept by position in each index, rows of the sheet that matched nothing are kept by their original name
+# The result of reconciling NinjaOne against the Domain (and optionally the XLSX sheet)
+# Every set is stored as a list of the original names in the order they were given
+class Reconciliation:
+    def __init__(self, ninja, domain, excel=None, threshold=default_threshold, fuzzy=True):
+        self.ninja = ninja
+        self.domain = domain
+        self.excel = excel
+        self.threshold = threshold
+        self.fuzzy = fuzzy
+
+        self.excel_only = []
+        self.excel_status = [] # (in domain, in ninja) for each row of the sheet, in sheet order
+        self.excel_matches = [] # (Match into domain or None, Match into ninja or None) for each row of the sheet
+
+        self.ninja_matches, self.domain_matches, self.ninja_near, self.domain_near = match_indexes(ninja, domain, threshold, fuzzy)
+
+        # Names matched on something other than the name itself (serial, DNS name, fuzzily), so in_ninja/in_domain agree with the matches
+        self.matched_in_domain = set(ninja.keys[i] for i in self.ninja_matches)
+        self.matched_in_ninja = set(domain.keys[j] for j in self.domain_matches)
+
+        if excel is not None:
+            for i, name in enumerate(excel.names):
+                record = excel.record(i)
+                matches = (self.best(domain, record), self.best(ninja, record))
+                status = (matches[0] is not None and matches[0].counts(threshold),
+                          matches[1] is not None and matches[1].counts(threshold))
+                self.excel_matches.append(matches)
+                self.excel_status.append(status)
+                if status == (False, False):
+                    self.excel_only.append(name)
+
+    # The exact match for a record, or the closest fuzzy candidate when there isn't one (check it with Match.counts())
+    def best(self, index, record):
+        match = index.lookup(*record)
+        if match is None and self.fuzzy:
+            match = index.closest(record)
+        return match
+
+    def in_ninja(self, name):
+        return name in self.ninja or name_key(name) in self.matched_in_ninja
+
+    def in_domain(self, name):
+        return name in self.domain or name_key(name) in self.matched_in_domain
+
+    # (name, closest rejected Match or None) for every device on one side ("ninja" or "domain") that wasn't matched, in order
+    def unmatched(self, side):
+        index, matches, near = (self.ninja, self.ninja_matches, self.ninja_near) if side == "ninja" else (self.domain, self.domain_matches, self.domain_near)
+        for i, name in enumerate(index.names):
+            if i not in matches:
+                yield name, near.get(i)
+
+    # Name of a matched/closest device on the other side
+    def name_of(self, side, match):
+        other = self.domain if side == "ninja" else self.ninja
+        return other.names[match.index]
@@ -0,0 +1,152 @@
+# NinjaOneToolKit - Snapshot store
+# A local SQLite copy of the organizations, devices and AD computers from the last run
+# Every snapshot records when it was taken so the menu options can answer from it while it is still fresh,
+# and refreshes only need to upsert the devices that have changed since
+
+import time
+import sqlite3
+
+
+schema = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    source TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    taken_at REAL NOT NULL,
+    PRIMARY KEY (source, scope)
+);
+CREATE TABLE IF NOT EXISTS orgs (
+    id INTEGER PRIMARY KEY,
+    name TEXT
+);
+CREATE TABLE IF NOT EXISTS devices (
+    id INTEGER PRIMARY KEY,
+    org_id INTEGER,
+    system_name TEXT,
+    status TEXT,
+    os TEXT,
+    brand TEXT,
+    model TEXT,
+    serial TEXT,
+    memory,
+    processor TEXT,
+    last_login TEXT,
+    last_boot TEXT,
+    last_update REAL,
+    last_contact REAL,
+    dns_name TEXT,
+    ip_address TEXT
+);
+CREATE INDEX IF NOT EXISTS devices_org ON devices (org_id);
+CREATE INDEX IF NOT EXISTS devices_name ON devices (system_name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS devices_serial ON devices (serial);
+CREATE TABLE IF NOT EXISTS device_details (
+    device_id INTEGER NOT NULL,
+    detail TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    value,
+    PRIMARY KEY (device_id, detail)
+);
+CREATE TABLE IF NOT EXISTS ad_computers (
+    name TEXT PRIMARY KEY COLLATE NOCASE,
+    dns TEXT,
+    ip TEXT
+);
+"""
+
+# Columns of the devices table in the same order as main.device_header
+device_columns = ["system_name", "id", "status", "os", "brand", "model", "serial", "memory", "processor", "last_login", "last_boot"]
+# Columns only used for matching devices against the domain, in Device.match_row() order
+match_columns = ["dns_name", "ip_address"]
+
+
+class SnapshotStore:
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(schema)
+        self.migrate()
+
+    # Add columns that snapshots taken by older versions don't have yet
+    # Devices stored before then are missing the new values, so their versions are cleared to have them downloaded again
+    def migrate(self):
+        existing = [row[1] for row in self.db.execute("PRAGMA table_info(devices)")]
+        missing = [c for c in match_columns if c not in existing]
+        if len(missing) > 0:
+            with self.db:
+                for column in missing:
+                    self.db.execute("ALTER TABLE devices ADD COLUMN " + column + " TEXT")
+                self.db.execute("UPDATE devices SET last_update = NULL")
+
+    def close(self):
+        self.db.close()
+
+    # How many seconds old the snapshot of a source (orgs, devices, ad) is, None if it has never been taken
+    def age(self, source, scope=""):
+        row = self.db.execute("SELECT taken_at FROM snapshots WHERE source = ? AND scope = ?", (source, str(scope))).fetchone()
+        return None if row is None else time.time() - row[0]
+
+    def fresh(self, source, scope, ttl):
+        age = self.age(source, scope)
+        return age is not None and age < ttl
+
+    def mark(self, source, scope=""):
+        self.db.execute("INSERT OR REPLACE INTO snapshots (source, scope, taken_at) VALUES (?, ?, ?)", (source, str(scope), time.time()))
+
+    # Organizations
+    def replace_orgs(self, organizations):
+        with self.db:
+            self.db.execute("DELETE FROM orgs")
+            self.db.executemany("INSERT INTO orgs (id, name) VALUES (?, ?)", [(org["id"], org["name"]) for org in organizations])
+            self.mark("orgs")
+
+    def orgs(self):
+        return [{"id": row[0], "name": row[1]} for row in self.db.execute("SELECT id, name FROM orgs ORDER BY name")]
+
+    # Devices
+    # The last update time NinjaOne reported for every device we have stored in an organization, keyed by device id
+    def device_versions(self, org_id):
+        return dict(self.db.execute("SELECT id, last_update FROM devices WHERE org_id = ?", (org_id,)))
+
+    # Insert or update device rows, each row is in device_columns order followed by last_update, last_contact and match_columns
+    def upsert_devices(self, org_id, rows):
+        columns = device_columns + ["last_update", "last_contact"] + match_columns + ["org_id"]
+        sql = ("INSERT INTO devices (" + ", ".join(columns) + ") VALUES (" + ", ".join("?" * len(columns)) + ") "
+               "ON CONFLICT(id) DO UPDATE SET " + ", ".join(c + " = excluded." + c for c in columns if c != "id"))
+        with self.db:
+            self.db.executemany(sql, (list(row) + [org_id] for row in rows))
+
+    def delete_devices(self, ids):
+        with self.db:
+            self.db.executemany("DELETE FROM devices WHERE id = ?", ((i,) for i in ids))
+
+    def mark_devices(self, org_id):
+        with self.db:
+            self.mark("devices", org_id)
+
+    # Yield the stored device rows of an organization a page at a time, in device_columns order followed by match_columns
+    def device_pages(self, org_id, page_size=1000):
+        cursor = self.db.execute("SELECT " + ", ".join(device_columns + match_columns) + " FROM devices WHERE org_id = ? ORDER BY id", (org_id,))
+        while True:
+            page = cursor.fetchmany(page_size)
+            if len(page) == 0:
+                break
+            yield [list(row) for row in page]
+
+    # Per device details added by enrichment (see enrich.py), returns (fetched at, value) or None
+    def device_detail(self, device_id, detail):
+        return self.db.execute("SELECT fetched_at, value FROM device_details WHERE device_id = ? AND detail = ?", (device_id, detail)).fetchone()
+
+    # Save details as rows of (device id, detail, fetched at, value)
+    def save_device_details(self, rows):
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO device_details (device_id, detail, fetched_at, value) VALUES (?, ?, ?, ?)", rows)
+
+    # Active Directory computers
+    def replace_ad(self, rows):
+        with self.db:
+            self.db.execute("DELETE FROM ad_computers")
+            self.db.executemany("INSERT OR REPLACE INTO ad_computers (name, dns, ip) VALUES (?, ?, ?)", rows)
+            self.mark("ad")
+
+    def ad_rows(self):
+        return [list(row) for row in self.db.execute("SELECT name, dns, ip FROM ad_computers ORDER BY rowid")]
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+# NinjaOneToolKit - Startup budget check
+# Makes sure importing the toolkit stays cheap, so the quick listing commands start well under a second
+# - Imports main with python -X importtime and fails if the import takes longer than the budget
+# - Fails if any of the heavy libraries (openpyxl, requests, tabulate, sqlite3) are loaded just by importing main
+# - Times a full "python3 main.py --help" start up and exit
+#
+# Usage : python3 startup_check.py [--budget MS] [--help-budget MS]
+# Exits with 1 when a budget is blown, so it can be run before merging or on a jump host after an upgrade
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+
+# Modules that must only be imported by the options that need them
+heavy_modules = ["openpyxl", "requests", "tabulate", "sqlite3", "ldap3"]
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+
+# Import main with -X importtime, returns {module: (self us, cumulative us)}
+def import_times():
+    p = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=here, capture_output=True, text=True)
+    if p.returncode != 0:
+        raise RuntimeError("Unable to import main - " + p.stderr.strip().splitlines()[-1])
+
+    times = {}
+    for line in p.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            times[parts[2].strip()] = (int(parts[0]), int(parts[1]))
+        except ValueError: # The header line
+            continue
+    return times
+
+
+# Wall time in ms of starting the CLI, printing its help and exiting
+def help_time():
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "main.py", "--help"], cwd=here, capture_output=True, check=True)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that NinjaOneToolKit starts within its time budget")
+    parser.add_argument('--budget', type=float, default=float(os.getenv('STARTUP_BUDGET_MS') or 150), help="Most ms importing main may take (default: 150)")
+    parser.add_argument('--help-budget', type=float, default=float(os.getenv('STARTUP_HELP_BUDGET_MS') or 500), help="Most ms python3 main.py --help may take (default: 500)")
+    args = parser.parse_args()
+
+    failed = False
+    times = import_times()
+    total = times["main"][1] / 1000
+
+    print("Slowest imports...")
+    for name, (own, cumulative) in sorted(times.items(), key=lambda item: item[1][1], reverse=True)[:10]:
+        print("  %8.1f ms  %s" % (cumulative / 1000, name))
+
+    print("\nimport main : %.1f ms (budget %.0f ms)" % (total, args.budget))
+    if total > args.budget:
+        print("ERROR: Importing main is over budget...")
+        failed = True
+
+    loaded = [name for name in heavy_modules if name in times]
+    if len(loaded) > 0:
+        print("ERROR: Importing main loaded " + ", ".join(loaded) + ", these should only be imported by the functions that use them...")
+        failed = True
+
+    elapsed = help_time()
+    print("main.py --help : %.1f ms (budget %.0f ms)" % (elapsed, args.help_budget))
+    if elapsed > args.help_budget:
+        print("ERROR: Starting the CLI is over budget...")
+        failed = True
+
+    print("\nFAILED" if failed else "\nOK")
+    return 1 if failed else 0
+
+
+if __name__=="__main__":
+    sys.exit(main())
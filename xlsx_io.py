@@ -0,0 +1,136 @@
+# NinjaOneToolKit - XLSX input/output
+# Workbook helpers that stream rows instead of holding a whole styled sheet in memory
+
+import os
+import csv
+import json
+import shutil
+import tempfile
+from copy import copy
+from itertools import chain, islice
+# OpenpyXL libraries
+import openpyxl as xl
+import openpyxl.styles as xlstyle
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.worksheet.table import Table, TableColumn, TableStyleInfo
+from openpyxl.utils import get_column_letter as xlgcl
+
+
+# Write rows straight from an iterator into a write-only workbook as a styled table, returns how many rows were written
+# Write-only sheets need their column widths before the first row goes out, so widths are sized from the header and
+# the first sample_size rows, only that sample is ever held in memory
+def write_streaming_xlsx(path, header, rows, table_name, notes_title=None, notes=(), sample_size=1000, sheet_title=None):
+    wb = xl.Workbook(write_only=True)
+    ws = wb.create_sheet(title=sheet_title)
+
+    rows = iter(rows)
+    sample = list(islice(rows, sample_size))
+
+    widths = [len(str(value)) for value in header]
+    for row in sample:
+        for i, value in enumerate(row):
+            if len(str(value)) > widths[i]:
+                widths[i] = len(str(value))
+    for i, width in enumerate(widths):
+        ws.column_dimensions[xlgcl(i + 1)].width = width + 2 # Add a little extra room in the cell to work with
+
+    # Style a single template cell and copy its style reference onto every other cell, the style itself is only registered once
+    template = WriteOnlyCell(ws)
+    template.alignment = xlstyle.Alignment(vertical='center', horizontal='center')
+    style = template._style
+
+    def styled(values):
+        cells = []
+        for value in values:
+            cell = WriteOnlyCell(ws, value=value)
+            cell._style = copy(style)
+            cells.append(cell)
+        return cells
+
+    ws.append(styled(header))
+    count = 0
+    for row in chain(sample, rows):
+        ws.append(styled(row))
+        count = count + 1
+
+    if count > 0:
+        table = Table(displayName=table_name, ref='A1:' + xlgcl(len(header)) + str(count + 1))
+        table.tableColumns = [TableColumn(id=i + 1, name=str(name)) for i, name in enumerate(header)] # Write-only sheets can't fill these in for us
+        table.tableStyleInfo = TableStyleInfo(name="TableStyle", showFirstColumn=True, showLastColumn=True,
+                            showRowStripes=True, showColumnStripes=True)
+        ws.add_table(table)
+
+    # Any notes go a few rows underneath the table
+    if notes_title is not None:
+        for i in range(4):
+            ws.append([])
+        ws.append([notes_title])
+        for note in notes:
+            ws.append([note])
+
+    wb.save(path)
+    return count
+
+
+# Read only the requested columns of a worksheet into lists, one list per column plus the sheet row number of each row
+# The workbook is opened read-only so styles and other sheets are never parsed, and rows are streamed rather than loaded
+# Rows with nothing in key_column are skipped
+def read_sheet_columns(path, sheet_name, columns, min_row, max_row, key_column=0):
+    data = {name: [] for name in columns}
+    data["row"] = []
+    width = max(list(columns.values()) + [key_column]) + 1 # Never build cells past the right most column we need
+
+    wb = xl.load_workbook(path, read_only=True)
+    try:
+        ws = wb[sheet_name]
+        for rownum, row in enumerate(ws.iter_rows(min_row=min_row, max_row=max_row, max_col=width, values_only=True), start=min_row):
+            if len(row) <= key_column or row[key_column] is None:
+                continue
+            for name, col in columns.items():
+                data[name].append(row[col] if col < len(row) else None)
+            data["row"].append(rownum)
+    finally:
+        wb.close() # Read-only workbooks keep the file open until closed
+
+    return data
+
+
+# Save a workbook next to its destination first and then swap it into place, so a failed save never leaves a half written file
+def save_atomic(wb, path):
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".~", suffix=".xlsx")
+    os.close(fd)
+    try:
+        wb.save(tmp_path)
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path) # mkstemp makes the file private, keep the permissions the sheet had
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# Write a batch of changed cells, each change is a dict with at least "cell" (ie. C12) and "new"
+def write_cells(path, sheet_name, changes):
+    wb = xl.load_workbook(path)
+    ws = wb[sheet_name]
+    for change in changes:
+        ws[change["cell"]] = change["new"]
+    save_atomic(wb, path)
+
+
+# Write a batch of changes as a CSV or JSON Lines delta file (chosen by the file extension) instead of touching the workbook
+def write_delta(path, changes, fields):
+    folder = os.path.dirname(os.path.abspath(path))
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+
+    with open(path, "w", newline="") as f:
+        if path.lower().endswith((".json", ".jsonl")):
+            for change in changes:
+                f.write(json.dumps({field: change.get(field) for field in fields}, default=str) + "\n")
+        else:
+            writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(changes)